@@ -0,0 +1,60 @@
+"""启动耗时基准: 用 -X importtime 测量轻量入口的导入耗时，并检查是否误加载了重量级依赖"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+# 模块 -> 默认预算（毫秒）
+BUDGETS = {
+    "ai_hub_agents": 600,
+    "ai_hub_agents.client": 800,
+    "ai_hub_agents.callback": 600,
+}
+
+# 轻量入口不应加载的模块
+HEAVY_MODULES = ["fastapi", "uvicorn", "langchain", "langgraph", "langchain_openai", "langchain_mcp_adapters"]
+
+_LINE_RE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\S+)")
+
+
+def measure(module: str, repeat: int) -> tuple[float, list[str]]:
+    """返回 (最小累计导入耗时 ms, 被加载的重量级模块)"""
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        r = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+        if r.returncode != 0:
+            sys.exit(f"[FAIL] import {module}\n{r.stderr}")
+        cumulative = 0
+        for line in r.stderr.splitlines():
+            m = _LINE_RE.match(line)
+            if m and m.group(3) == module:
+                cumulative = int(m.group(2))
+        ms = cumulative / 1000
+        best = ms if best is None else min(best, ms)
+        loaded = [m for m in r.stdout.strip().split(",") if m]
+    return best, loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="导入耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最小值")
+    parser.add_argument("--scale", type=float, default=1.0, help="预算缩放系数（慢机器上调大）")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        ms, loaded = measure(module, args.repeat)
+        budget *= args.scale
+        ok = ms <= budget and not loaded
+        failed |= not ok
+        extra = f"  loaded: {' '.join(loaded)}" if loaded else ""
+        print(f"{'[OK]  ' if ok else '[FAIL]'} {module:<28} {ms:8.1f} ms / {budget:.0f} ms{extra}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""本地模拟 OpenAI 兼容接口，用于测试多端点路由、熔断和对冲请求"""
+import argparse
+import asyncio
+import random
+import time
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+def get_args() -> argparse.Namespace:
+    """获取命令行参数"""
+    parser = argparse.ArgumentParser(description='Fake OpenAI-compatible LLM server')
+    parser.add_argument('--port', type=int, default=9100, help='端口')
+    parser.add_argument('--delay', type=float, default=0.05, help='正常响应延迟（秒）')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='慢响应比例')
+    parser.add_argument('--slow-delay', type=float, default=3.0, help='慢响应延迟（秒）')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 500 的比例')
+    return parser.parse_args()
+
+args = get_args()
+app = FastAPI()
+counter = 0
+
+@app.post("/v1/chat/completions")
+async def chat(request: Request):
+    global counter
+    counter += 1
+    body = await request.json()
+    messages = body["messages"]
+
+    if random.random() < args.fail_rate:
+        raise HTTPException(500, "fake failure")
+    await asyncio.sleep(args.slow_delay if random.random() < args.slow_rate else args.delay)
+
+    content = f"[{args.port}] echo: {messages[-1].get('content')}"
+    return {
+        "id": f"fake-{counter}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10 * len(messages), "completion_tokens": 5, "total_tokens": 10 * len(messages) + 5},
+    }
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
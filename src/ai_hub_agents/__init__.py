@@ -1,8 +1,29 @@
+from typing import TYPE_CHECKING
+import importlib
 from .settings import settings,load_settings
-from .core.agent import Agent
-from .core import setup_log
-from .app import run
-from . import client
+
+if TYPE_CHECKING:
+    from .core.agent import Agent
+    from .core import setup_log
+    from .app import run
+    from . import client
+
+# 按属性延迟导入，避免只用客户端或回调时加载 FastAPI / LangChain 全家桶
+_LAZY_ATTRS = {
+    "Agent": (".core.agent", "Agent"),
+    "setup_log": (".core.log", "setup_log"),
+    "run": (".app", "run"),
+    "client": (".client", None),
+}
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_ATTRS[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
 
 __all__ = [
     "settings",
@@ -11,4 +32,4 @@ __all__ = [
     "setup_log",
     "run",
     "client",
-]
\ No newline at end of file
+]
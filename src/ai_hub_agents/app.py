@@ -1,33 +1,65 @@
 import asyncio
-from fastapi import FastAPI, Form, File, UploadFile, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, File, UploadFile, HTTPException, Query
+from fastapi.responses import FileResponse
 from collections import defaultdict
 import uvicorn
 from ai_hub_agents import settings
-from pydantic import BaseModel, Field
+from .models import FilePart, ResponseModel
 from .callback import APIRequest, APIResponse, APIRoundtrip
-from .renderers import AppServe
+from .renderers import AppServe, Recorder
+from .core.usage import usage_tracker, TokenBudgetExceeded
+from .core.metrics import metrics
+from .core.maintenance import maintenance_scheduler
+from .core.config_watcher import config_watcher
+from .core.scheduler import fair_scheduler, Priority, SchedulerRejected
+from .batch import batch_manager
+from .core.history import history_snapshots, SnapshotExpired
+from .tools import get_all_tools, tool_executor
 import logging
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动和关闭后台任务"""
+    # 加载配置快照并启动配置监视线程
+    await asyncio.to_thread(config_watcher.snapshot)
+    # 按用户的用量汇总需要扫描所有线程，启动时完成，避免首个请求阻塞事件循环
+    await asyncio.to_thread(usage_tracker.load)
+    maintenance_scheduler.start()
+    batch_manager.resume_all()
+    # 预加载工具，提前启动 process 模式需要的进程池
+    await asyncio.to_thread(get_all_tools)
+    yield
+    await batch_manager.stop()
+    await maintenance_scheduler.stop()
+    tool_executor.shutdown()
+    config_watcher.stop()
 
-logger = logging.getLogger(__name__)
+app = FastAPI(lifespan=lifespan)
 
-# 每个 thread_id 一个锁
-_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+logger = logging.getLogger(__name__)
 
-class FilePart(BaseModel):
-    filename: str = Field(..., description="文件名")
-    content: str = Field(..., description="文件内容")
-    type: str | None = Field(None, description="文件类型")
+# 每个 thread_id 一个锁，_lock_refs 记录持有或等待的数量
+_locks: dict[str, asyncio.Lock] = {}
+_lock_refs: dict[str, int] = defaultdict(int)
 
-class ResponseModel(BaseModel):
-    response: str = Field(..., description="响应文本")
-    files: list[FilePart] = Field(default_factory=list, description="文件列表")
+@asynccontextmanager
+async def _thread_lock(thread_id: str):
+    """持有线程锁；没有持有或等待者时删除，避免内存泄漏"""
+    lock = _locks.setdefault(thread_id, asyncio.Lock())
+    _lock_refs[thread_id] += 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _lock_refs[thread_id] -= 1
+        if _lock_refs[thread_id] == 0:
+            del _lock_refs[thread_id]
+            del _locks[thread_id]
 
-# 清理长期不用的 lock，避免内存泄漏
-def _get_lock(thread_id: str) -> asyncio.Lock:
-    lock = _locks[thread_id]
-    return lock
+# 后台维护与请求共用线程锁，删除/归档不会与正在处理的请求交错
+maintenance_scheduler.thread_lock = _thread_lock
+maintenance_scheduler.thread_busy = lambda thread_id: thread_id in _locks
 
 @app.post("/",response_model=ResponseModel)
 async def endpoint(
@@ -35,21 +67,95 @@ async def endpoint(
     query: str = Form(..., description="查询文本"),
     files: list[UploadFile] = File(default_factory=list, description="文件列表"),
     user_name: str|None = Form(None, description="用户名称"),
+    priority: Priority = Form("interactive", description="优先级：interactive 交互 / batch 批处理"),
 ):
-    lock = _get_lock(thread_id)
+    return await handle_request(thread_id, query, files, user_name, priority)
+
+async def handle_request(
+    thread_id: str,
+    query: str,
+    files: list[UploadFile],
+    user_name: str|None,
+    priority: Priority = "interactive",
+) -> APIResponse:
+    """排队并处理一次请求，HTTP 接口和批处理共用"""
     queue_timeout = settings.app_queue_timeout
     exec_timeout = settings.app_exec_timeout
+    deadline = asyncio.get_running_loop().time() + queue_timeout
 
     try:
         # 排队：超时则放弃
         async with asyncio.timeout(queue_timeout):
-            async with lock:
-                # 进入锁后，用执行超时包裹实际逻辑
-                async with asyncio.timeout(exec_timeout):
-                    return await _do_work(query, thread_id, files, user_name)
+            async with _thread_lock(thread_id):
+                # 同一 thread_id 串行，不同用户之间按权重公平分配执行槽
+                async with fair_scheduler.slot(user_name or "user", priority, deadline):
+                    # 进入锁后，用执行超时包裹实际逻辑
+                    async with asyncio.timeout(exec_timeout):
+                        return await _do_work(query, thread_id, files, user_name)
+    except SchedulerRejected as e:
+        logger.warning(f"排队拒绝: {thread_id}, {user_name}, {e}")
+        raise HTTPException(503, str(e))
     except asyncio.TimeoutError:
         logger.error(f"请求超时: {query}, {thread_id}, {files}, {user_name}")
         raise HTTPException(504, "请求超时")
+    except TokenBudgetExceeded as e:
+        logger.warning(f"超出 token 预算: {thread_id}, {user_name}")
+        raise HTTPException(429, str(e))
+
+@app.post("/batch")
+async def submit_batch(
+    file: UploadFile = File(..., description="JSONL 文件，每行 {thread_id, query, user_name}"),
+):
+    """提交批处理任务"""
+    content = await file.read()
+    job_id = await batch_manager.submit(content)
+    return {"job_id": job_id}
+
+@app.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """批处理任务进度"""
+    return await asyncio.to_thread(batch_manager.status, job_id)
+
+@app.get("/batch/{job_id}/results")
+async def get_batch_results(job_id: str):
+    """批处理结果（JSONL）"""
+    path = batch_manager.output_path(job_id)
+    if not path.exists():
+        raise HTTPException(404, f"结果不存在: {job_id}")
+    return FileResponse(path, media_type="application/x-ndjson")
+
+@app.post("/batch/{job_id}/resume")
+async def resume_batch(job_id: str):
+    """恢复中断的批处理任务"""
+    return await batch_manager.resume(job_id)
+
+@app.get("/threads/{thread_id}/messages")
+async def get_thread_messages(
+    thread_id: str,
+    offset: int = Query(0, ge=0, description="起始位置"),
+    limit: int = Query(100, ge=1, le=1000, description="条数"),
+    generation: int | None = Query(None, description="快照版本，翻页时传回第一页返回的 generation"),
+):
+    """分页读取线程历史的一致快照，不阻塞正在进行的对话"""
+    try:
+        return await asyncio.to_thread(history_snapshots.page, thread_id, offset, limit, generation)
+    except SnapshotExpired as e:
+        raise HTTPException(410, str(e))
+
+@app.get("/usage")
+async def get_usage():
+    """所有用户的 token 用量"""
+    return await asyncio.to_thread(usage_tracker.user_usage)
+
+@app.get("/usage/{thread_id}")
+async def get_thread_usage(thread_id: str):
+    """线程的 token 用量"""
+    return await asyncio.to_thread(usage_tracker.thread_usage, thread_id)
+
+@app.get("/metrics")
+async def get_metrics():
+    """进程内指标"""
+    return await asyncio.to_thread(metrics.collect)
 
 async def _do_work(query: str, thread_id: str, files: list[UploadFile], user_name: str|None) -> APIResponse:
     """实际业务逻辑"""
@@ -74,6 +180,8 @@ def run(host: str = None, port: int = None, reload: bool = None):
     reload = reload if reload is not None else settings.reload
 
     AppServe()
+    if settings.record_path:
+        Recorder(settings.record_path)
     
     uvicorn.run(
         "ai_hub_agents.app:app",           # 或 app
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from fastapi import HTTPException
+from ai_hub_agents import settings
+from .core.json_store import JsonStore
+from .core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIR_NAME = "_batch"
+"""批处理目录名，位于 data_dir 下"""
+MAX_RETRIES = 3
+"""排队被拒绝（503）时的重试次数"""
+
+class BatchManager:
+    """
+    批处理任务
+
+    提交一个 JSONL 文件（每行 {"thread_id", "query", "user_name"}）后返回任务 ID，
+    由后台按 batch_concurrency 并发处理：同一 thread_id 的行按文件顺序串行，
+    不同 thread_id 之间并行，均以 batch 优先级进入调度器。
+    每处理完一行立即追加到 output.jsonl（带行号），它同时作为断点：
+    任务中断后重启服务或调用 resume，会跳过已输出的行继续处理。
+
+    目录结构：data_dir/_batch/<job_id>/{input.jsonl, output.jsonl, state.json}
+    结束超过 batch_retention_days 的任务目录由后台维护（MaintenanceScheduler）删除。
+    """
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def _job_dir(self, job_id: str) -> Path:
+        """任务目录"""
+        return Path(settings.data_dir) / BATCH_DIR_NAME / job_id
+
+    def _state(self, job_id: str) -> JsonStore:
+        """任务状态存储"""
+        return JsonStore(self._job_dir(job_id) / "state.json")
+
+    def output_path(self, job_id: str) -> Path:
+        """结果文件路径"""
+        return self._job_dir(job_id) / "output.jsonl"
+
+    async def submit(self, content: bytes) -> str:
+        """提交任务，返回任务 ID"""
+        job_id = await asyncio.to_thread(self._create, content)
+        self.start(job_id)
+        return job_id
+
+    async def resume(self, job_id: str) -> dict:
+        """恢复中断或失败的任务"""
+        state = await asyncio.to_thread(self.status, job_id)
+        if state["status"] != "completed":
+            await asyncio.to_thread(self._state(job_id).update, lambda s: s | {"status": "running"})
+            self.start(job_id)
+        return await asyncio.to_thread(self.status, job_id)
+
+    def _create(self, content: bytes) -> str:
+        """写入任务文件"""
+        try:
+            text = content.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise HTTPException(400, f"文件不是 UTF-8 编码: {e}")
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        (job_dir / "input.jsonl").write_bytes(content)
+        total = sum(1 for line in text.splitlines() if line.strip())
+        self._state(job_id).write({
+            "job_id": job_id,
+            "status": "running",
+            "total": total,
+            "done": 0,
+            "failed": 0,
+            "created_at": time.time(),
+            "finished_at": None,
+        })
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        """任务状态"""
+        state = self._state(job_id).read()
+        if not state:
+            raise HTTPException(404, f"任务不存在: {job_id}")
+        return state
+
+    def start(self, job_id: str):
+        """启动（或恢复）任务"""
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            return
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    def resume_all(self):
+        """恢复所有未完成的任务"""
+        batch_dir = Path(settings.data_dir) / BATCH_DIR_NAME
+        if not batch_dir.is_dir():
+            return
+        for job_dir in batch_dir.iterdir():
+            state = self._state(job_dir.name).read()
+            if state.get("status") == "running":
+                logger.info(f"恢复批处理任务: {job_dir.name}")
+                self.start(job_dir.name)
+
+    async def stop(self):
+        """停止所有任务，已完成的行保留在输出文件中"""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def collect(self) -> dict:
+        """指标采集"""
+        return {"running": sum(1 for task in self._tasks.values() if not task.done())}
+
+    async def _run(self, job_id: str):
+        """处理任务"""
+        output_path = self.output_path(job_id)
+        try:
+            groups, state = await asyncio.to_thread(self._load, job_id)
+        except Exception:
+            logger.exception(f"批处理任务读取失败: {job_id}")
+            await asyncio.to_thread(self._state(job_id).update, lambda s: s | {"status": "failed"})
+            return
+
+        semaphore = asyncio.Semaphore(max(1, settings.batch_concurrency))
+        output = open(output_path, "a", encoding="utf-8")
+        if output.tell() > 0 and not output_path.read_bytes().endswith(b"\n"):
+            # 补齐中断时写了一半的行
+            output.write("\n")
+        last_flush = time.monotonic()
+
+        def write_result(result: dict):
+            nonlocal last_flush
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            key = "failed" if "error" in result else "done"
+            state[key] += 1
+            if time.monotonic() - last_flush > 1:
+                self._state(job_id).write(state)
+                last_flush = time.monotonic()
+
+        async def run_group(items: list[tuple[int, dict]]):
+            for index, item in items:
+                async with semaphore:
+                    write_result(await self._process(index, item))
+
+        try:
+            await asyncio.gather(*(run_group(items) for items in groups.values()))
+            state["status"] = "completed"
+            state["finished_at"] = time.time()
+            logger.info(f"批处理任务完成: {job_id}")
+        except Exception:
+            state["status"] = "failed"
+            logger.exception(f"批处理任务失败: {job_id}")
+        finally:
+            output.close()
+            self._state(job_id).write(state)
+
+    def _load(self, job_id: str) -> tuple[dict[str, list[tuple[int, dict]]], dict]:
+        """读取输入和断点，返回 (按 thread_id 分组的待处理行, 任务状态)"""
+        done = self._load_checkpoint(self.output_path(job_id))
+
+        # 按 thread_id 分组，组内保持文件顺序
+        groups: dict[str, list[tuple[int, dict]]] = defaultdict(list)
+        index = 0
+        with open(self._job_dir(job_id) / "input.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if index not in done:
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        item = {"error": f"无效的 JSON: {e}"}
+                    if not isinstance(item, dict):
+                        item = {"error": "每行必须是 JSON 对象"}
+                    groups[str(item.get("thread_id", ""))].append((index, item))
+                index += 1
+
+        state = self._state(job_id).read()
+        state["done"] = sum(1 for failed in done.values() if not failed)
+        state["failed"] = sum(1 for failed in done.values() if failed)
+        return groups, state
+
+    async def _process(self, index: int, item: dict) -> dict:
+        """处理一行"""
+        from .app import handle_request
+
+        result = {"index": index, "thread_id": item.get("thread_id")}
+        if "error" in item:
+            return result | {"error": item["error"]}
+        if not item.get("thread_id") or not item.get("query"):
+            return result | {"error": "缺少 thread_id 或 query"}
+        if not all(isinstance(item.get(k), str) for k in ("thread_id", "query")) or not isinstance(item.get("user_name"), (str, type(None))):
+            return result | {"error": "thread_id、query、user_name 必须是字符串"}
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = await handle_request(item["thread_id"], item["query"], [], item.get("user_name"), "batch")
+                return result | {"response": response.response}
+            except HTTPException as e:
+                if e.status_code == 503 and attempt < MAX_RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                return result | {"error": f"{e.status_code} {e.detail}"}
+            except Exception as e:
+                logger.exception(f"批处理行失败: {index}")
+                return result | {"error": str(e)}
+
+    @staticmethod
+    def _load_checkpoint(output_path: Path) -> dict[int, bool]:
+        """读取已输出的行：行号 -> 是否失败"""
+        done = {}
+        if not output_path.exists():
+            return done
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                    done[result["index"]] = "error" in result
+                except (json.JSONDecodeError, KeyError):
+                    # 中断时可能写了半行
+                    continue
+        return done
+
+batch_manager = BatchManager()
+metrics.register("batch", batch_manager.collect)
+
+__all__ = [
+    "BatchManager",
+    "batch_manager",
+]
@@ -1,9 +1,11 @@
 from __future__ import annotations
-from typing import ClassVar, Callable, Any, TypeVar
-from fastapi import UploadFile
+from typing import ClassVar, Callable, Any, TypeVar, TYPE_CHECKING
 import asyncio
 import logging
 
+if TYPE_CHECKING:
+    from fastapi import UploadFile
+
 logger = logging.getLogger(__name__)
 T = TypeVar("T", bound="Callback")
 
@@ -99,6 +101,15 @@ class ToolCall(Callback):
     args: dict
     """参数"""
 
+class LLMResponse(Callback):
+    """LLM 单次调用的响应"""
+    message: Any
+    """AI 消息（AIMessage）"""
+    elapsed: float
+    """耗时（秒）"""
+    input_messages: list | None = None
+    """本次调用的输入消息（不含系统提示词）"""
+
 class ToolResponse(Callback):
     """工具响应"""
     tool_name: str
@@ -118,6 +129,19 @@ class AssistantResponse(Callback):
     content: str
     """内容"""
 
+class TokenUsage(Callback):
+    """一轮对话的 token 用量"""
+    thread_id: str
+    """线程ID"""
+    user_name: str
+    """用户名称"""
+    input_tokens: int
+    """输入 token 数"""
+    output_tokens: int
+    """输出 token 数"""
+    cached_tokens: int = 0
+    """命中前缀缓存的输入 token 数"""
+
 class AgentCreate(Callback):
     """创建代理"""
     thread_id: str
@@ -155,8 +179,10 @@ __all__ = [
     "Callback",
     "LoadMCPTools",
     "ToolCall",
+    "LLMResponse",
     "ToolResponse",
     "UserQuery",
     "AssistantResponse",
+    "TokenUsage",
     "AgentCreate",
 ]
\ No newline at end of file
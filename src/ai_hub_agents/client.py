@@ -1,9 +1,9 @@
 import requests
 from pathlib import Path
 import mimetypes
-from .app import ResponseModel
+from .models import ResponseModel
 
-def post(url: str, thread_id: str, query: str, user_name: str, file_paths: list[str]=None) -> ResponseModel:
+def post(url: str, thread_id: str, query: str, user_name: str, file_paths: list[str]=None, priority: str="interactive") -> ResponseModel:
     """
     POST 请求
     Args:
@@ -12,12 +12,13 @@ def post(url: str, thread_id: str, query: str, user_name: str, file_paths: list[
         query: 查询文本
         user_name: 用户名称
         file_paths: 文件路径列表
+        priority: 优先级（interactive / batch）
     Returns:
         ResponseModel: 响应数据
     """
     if file_paths is None:
         file_paths = []
-    data = {"thread_id": thread_id, "query": query, "user_name": user_name}
+    data = {"thread_id": thread_id, "query": query, "user_name": user_name, "priority": priority}
     files = [
         ("files", (Path(file).name, open(file, "rb"), get_content_type(file)))
         for file in file_paths
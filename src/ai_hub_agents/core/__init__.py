@@ -1,7 +1,27 @@
-from .log import setup_log
-from .agent import Agent
+from typing import TYPE_CHECKING
+import importlib
+
+if TYPE_CHECKING:
+    from .log import setup_log
+    from .agent import Agent
+    from .config_watcher import config_watcher
+
+_LAZY_ATTRS = {
+    "setup_log": (".log", "setup_log"),
+    "Agent": (".agent", "Agent"),
+    "config_watcher": (".config_watcher", "config_watcher"),
+}
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_ATTRS[name]
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    globals()[name] = value
+    return value
 
 __all__ = [
     "setup_log",
     "Agent",
-]
\ No newline at end of file
+    "config_watcher",
+]
@@ -2,17 +2,23 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_mcp_adapters.tools import load_mcp_tools
 from langchain.agents import create_agent
 from ai_hub_agents import settings
-import json
 from typing import List
 from pathlib import Path
 from langchain_core.messages import BaseMessage,HumanMessage,AIMessage
 from contextlib import AsyncExitStack
-from ai_hub_agents.callback import LoadMCPTools,UserQuery,AssistantResponse,AgentCreate
+from ai_hub_agents.callback import LoadMCPTools,UserQuery,AssistantResponse,AgentCreate,TokenUsage
 from pydantic import BaseModel, ConfigDict
 from langchain_core.tools import BaseTool
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from .json_store import JsonStore
+from .config_watcher import ConfigSnapshot, config_watcher
+from .usage import usage_tracker
+from .context import build_context, build_retrieval_context
+from .memory_index import MemoryIndex
+import asyncio
 import logging
+import time
 from .message_simplify import messages_to_simple,simple_to_messages
 from ai_hub_agents.tools import get_all_tools
 from langgraph.graph.state import CompiledStateGraph
@@ -32,33 +38,32 @@ class Agent(BaseModel):
     """提示词"""
     json_store: JsonStore = None
     """JSON 存储"""
+    config: ConfigSnapshot = None
+    """配置快照"""
+    llm: BaseChatModel = None
+    """LLM，为空时按配置创建"""
+    tools: List[BaseTool] = None
+    """工具列表，为空时加载 MCP 工具和本地工具"""
 
     def model_post_init(self,ctx):
         """初始化"""
-        if not settings.llm_api_key:
-            raise ValueError("LLM API 密钥不能为空")
-        if not settings.llm_base_url:
-            raise ValueError("LLM 基础 URL 不能为空")
-        if not settings.llm_model:
-            raise ValueError("LLM 模型不能为空")
+        if self.llm is None and not settings.llm_endpoints:
+            if not settings.llm_api_key:
+                raise ValueError("LLM API 密钥不能为空")
+            if not settings.llm_base_url:
+                raise ValueError("LLM 基础 URL 不能为空")
+            if not settings.llm_model:
+                raise ValueError("LLM 模型不能为空")
 
+        if self.config is None:
+            self.config = config_watcher.snapshot()
         self._load_mcp_client()
         self._load_prompt()
         self._load_json_store()
 
     def _load_mcp_client(self):
         """加载 MCP 客户端"""
-        if Path(settings.mcp_path).exists():
-            with open(settings.mcp_path, "r", encoding="utf-8") as f:
-                mcp_metadata = json.load(f)
-            mcp_servers: dict = mcp_metadata.get("mcpServers", {})
-
-            # 默认值
-            mcp_servers = {k: v|{
-                "transport": "stdio",
-            } for k,v in mcp_servers.items()}
-        else:
-            mcp_servers = {}
+        mcp_servers = self.config.mcp_servers
 
         self.mcp_client = MultiServerMCPClient(mcp_servers)
         self.mcp_server_names = mcp_servers.keys()
@@ -67,12 +72,7 @@ class Agent(BaseModel):
 
     def _load_prompt(self):
         """加载提示词"""
-        if Path(settings.prompt_path).exists():
-            with open(settings.prompt_path, "r", encoding="utf-8") as f:
-                prompt = f.read()
-        else:
-            prompt = ""
-        self.prompt = prompt
+        self.prompt = self.config.prompt
 
     def _load_json_store(self):
         """加载 JSON 存储"""
@@ -95,7 +95,22 @@ class Agent(BaseModel):
 
     def _append_memory(self,message:BaseMessage):
         """追加记忆"""
-        self._save_memory(self._load_memory()+[message])
+        messages = self._load_memory()
+        self._save_memory(messages+[message])
+        # 记忆索引不在这里更新：向量化可能是阻塞的网络请求，
+        # 下次检索时 _retrieve_context 在线程池中批量补齐缺失的消息
+
+    def _memory_index(self) -> MemoryIndex:
+        """记忆向量索引"""
+        return MemoryIndex(Path(settings.data_dir) / self.thread_id)
+
+    def _retrieve_context(self, messages: List[BaseMessage], query: str) -> List[BaseMessage]:
+        """检索相关历史，拼接最近消息"""
+        index = self._memory_index()
+        index.sync([_message_text(m) for m in messages])
+        before = max(0, len(messages) - settings.memory_index_recent)
+        relevant = index.search(query, settings.memory_index_top_k, before=before)
+        return build_retrieval_context(messages, relevant, settings.memory_index_recent)
 
     async def run(self,query:str,user_name:str="user") -> str:
         """运行一轮对话
@@ -106,35 +121,20 @@ class Agent(BaseModel):
             对话结果
         """
         UserQuery.trigger(query=query,name=user_name)
+        await asyncio.to_thread(usage_tracker.check_budget, self.thread_id)
 
         async with AsyncExitStack() as stack:
-            # 同时持有所有服务器的 session
-            sessions = {}
-            for name in self.mcp_server_names:
-                session = await stack.enter_async_context(self.mcp_client.session(name))
-                sessions[name] = session
-
-            # 合并所有服务器的 tools，用 server_name 做前缀避免重名
-            all_tools: List[BaseTool] = []
-            for name, session in sessions.items():
-                tools = await load_mcp_tools(
-                    session,
-                    server_name=name,
-                    tool_name_prefix=True  # 如 "mcp-tool-web-search_search"
-                )
-                all_tools.extend(tools)
-            all_tools.extend(get_all_tools())
+            if self.tools is not None:
+                all_tools = list(self.tools)
+            else:
+                all_tools = await self._load_tools(stack)
 
             # 加载工具事件
             tool_names = [tool.name for tool in all_tools]
             LoadMCPTools.trigger(tool_names=tool_names)
 
             # 加载 LLM
-            llm = ChatOpenAI(
-                model=settings.llm_model,
-                api_key=settings.llm_api_key,
-                base_url=settings.llm_base_url,
-            )
+            llm = self.llm or self._load_llm()
 
             # 记录用户消息
             human_content = f"[{user_name}]: {query}"
@@ -146,23 +146,83 @@ class Agent(BaseModel):
                 system_prompt=self.prompt,
             )
 
-            response = await self._astream(agent, self._load_memory())
+            usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "input_token_details": {"cache_read": 0}}
+            memory = self._load_memory()
+            if settings.memory_index:
+                messages = await asyncio.to_thread(self._retrieve_context, memory, human_content)
+            else:
+                messages = build_context(
+                    memory,
+                    mode=settings.context_mode,
+                    max_length=settings.max_context_length,
+                    block_size=settings.context_block_size,
+                )
+            response = await self._astream(agent, messages, usage)
 
             # AI 回答
-            self._append_memory(AIMessage(content=response))
+            self._append_memory(AIMessage(content=response, usage_metadata=usage))
             AssistantResponse.trigger(content=response)
 
+            # token 用量
+            cached_tokens = usage["input_token_details"]["cache_read"]
+            await asyncio.to_thread(
+                usage_tracker.record,
+                self.thread_id, user_name or "user", usage["input_tokens"], usage["output_tokens"], cached_tokens,
+            )
+            TokenUsage.trigger(
+                thread_id=self.thread_id,
+                user_name=user_name or "user",
+                input_tokens=usage["input_tokens"],
+                output_tokens=usage["output_tokens"],
+                cached_tokens=cached_tokens,
+            )
+
             return response
 
-    async def _astream(self, agent: CompiledStateGraph, messages: list[BaseMessage]) -> str:
+    def _load_llm(self) -> BaseChatModel:
+        """按配置创建 LLM：配置了多个端点时走路由"""
+        if settings.llm_endpoints:
+            from .llm_router import RoutedChatModel
+            return RoutedChatModel()
+        return ChatOpenAI(
+            model=settings.llm_model,
+            api_key=settings.llm_api_key,
+            base_url=settings.llm_base_url,
+        )
+
+    async def _load_tools(self, stack: AsyncExitStack) -> List[BaseTool]:
+        """加载 MCP 工具和本地工具，MCP session 的生命周期由 stack 管理"""
+        # 同时持有所有服务器的 session
+        sessions = {}
+        for name in self.mcp_server_names:
+            session = await stack.enter_async_context(self.mcp_client.session(name))
+            sessions[name] = session
+
+        # 合并所有服务器的 tools，用 server_name 做前缀避免重名
+        all_tools: List[BaseTool] = []
+        for name, session in sessions.items():
+            tools = await load_mcp_tools(
+                session,
+                server_name=name,
+                tool_name_prefix=True  # 如 "mcp-tool-web-search_search"
+            )
+            all_tools.extend(tools)
+        all_tools.extend(get_all_tools())
+        return all_tools
+
+    async def _astream(self, agent: CompiledStateGraph, messages: list[BaseMessage], usage: dict | None = None) -> str:
         """
         流式执行 agent，并实时触发 CallTool、ToolResponse 回调。
+        若传入 usage，则把本轮所有 LLM 调用的 token 用量累加进去。
         返回最终 AI 回复文本。
         """
         from langchain_core.messages import AIMessage, ToolMessage
-        from ai_hub_agents.callback import ToolCall, ToolResponse
+        from ai_hub_agents.callback import ToolCall, ToolResponse, LLMResponse
 
         last_response = ""
+        step_start = time.perf_counter()
+        # 最近一次的完整状态，即下一次 LLM 调用的输入
+        current_messages = list(messages)
 
         async for mode, chunk in agent.astream(
             {"messages": messages},
@@ -171,6 +231,13 @@ class Agent(BaseModel):
             if mode == "updates":
                 for _node, update in chunk.items():
                     for msg in update.get("messages", []):
+                        if isinstance(msg, AIMessage):
+                            LLMResponse.trigger(message=msg, elapsed=time.perf_counter() - step_start, input_messages=current_messages)
+                        if usage is not None and isinstance(msg, AIMessage) and msg.usage_metadata:
+                            for key in ("input_tokens", "output_tokens", "total_tokens"):
+                                usage[key] += msg.usage_metadata.get(key, 0)
+                            details = msg.usage_metadata.get("input_token_details") or {}
+                            usage["input_token_details"]["cache_read"] += details.get("cache_read", 0)
                         if isinstance(msg, AIMessage) and getattr(msg, "tool_calls", None):
                             for tc in msg.tool_calls:
                                 ToolCall.trigger(
@@ -179,9 +246,19 @@ class Agent(BaseModel):
                                 )
                         elif isinstance(msg, ToolMessage):
                             ToolResponse.trigger(tool_name=getattr(msg, "name", ""), result=msg.content)
+                    # 下一次 LLM 调用从本批更新之后开始计时
+                    step_start = time.perf_counter()
             elif mode == "values":
                 msgs = chunk.get("messages", [])
+                current_messages = msgs
                 if msgs:
                     last_response = getattr(msgs[-1], "content", "") or ""
 
-        return last_response
\ No newline at end of file
+        return last_response
+
+def _message_text(message: BaseMessage) -> str:
+    """消息的纯文本内容"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from ai_hub_agents import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """配置快照（只读）"""
+    version: int
+    """版本号，每次重新加载递增"""
+    prompt: str = ""
+    """提示词"""
+    mcp_servers: dict = field(default_factory=dict)
+    """MCP 服务配置"""
+
+class ConfigWatcher:
+    """
+    配置监视器
+
+    启动时加载 prompt.md、mcp.json（以及 load_settings 传入的 YAML），
+    之后由后台线程按 mtime 轮询，文件变更时重新加载并整体替换快照。
+    Agent 只从内存读取快照，不再每次请求读盘。
+    """
+    def __init__(self):
+        self._snapshot: ConfigSnapshot | None = None
+        self._mtimes: dict[str, int | None] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def snapshot(self) -> ConfigSnapshot:
+        """获取当前快照，首次调用时加载并启动监视线程"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._reload()
+                snapshot = self._snapshot
+            self.start()
+        return snapshot
+
+    def start(self):
+        """启动后台轮询线程"""
+        if settings.config_poll_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="config-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台轮询线程"""
+        self._stop.set()
+
+    def _watched_paths(self) -> list[str]:
+        """需要监视的文件"""
+        from ai_hub_agents.settings import settings_path
+        paths = [settings.prompt_path, settings.mcp_path]
+        if settings_path():
+            paths.append(settings_path())
+        return paths
+
+    def _stat(self) -> dict[str, int | None]:
+        """读取所有监视文件的 mtime"""
+        mtimes = {}
+        for path in self._watched_paths():
+            try:
+                mtimes[path] = Path(path).stat().st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _watch(self):
+        """轮询文件变更"""
+        while not self._stop.wait(settings.config_poll_interval):
+            try:
+                if self._stat() != self._mtimes:
+                    with self._lock:
+                        self._reload()
+                    logger.info(f"配置已重新加载: v{self._snapshot.version}")
+            except Exception:
+                logger.exception("重新加载配置失败")
+
+    def _reload(self):
+        """加载所有文件并发布新快照（需持有锁）"""
+        from ai_hub_agents.settings import settings_path, load_settings
+
+        mtimes = self._stat()
+        yaml_path = settings_path()
+        if yaml_path and self._mtimes and mtimes.get(yaml_path) != self._mtimes.get(yaml_path):
+            load_settings(yaml_path)
+            mtimes = self._stat()
+
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        self._snapshot = ConfigSnapshot(
+            version=version,
+            prompt=self._read_prompt(),
+            mcp_servers=self._read_mcp_servers(),
+        )
+        self._mtimes = mtimes
+
+    @staticmethod
+    def _read_prompt() -> str:
+        """读取提示词"""
+        if Path(settings.prompt_path).exists():
+            with open(settings.prompt_path, "r", encoding="utf-8") as f:
+                return f.read()
+        return ""
+
+    @staticmethod
+    def _read_mcp_servers() -> dict:
+        """读取 MCP 服务配置"""
+        if not Path(settings.mcp_path).exists():
+            return {}
+        with open(settings.mcp_path, "r", encoding="utf-8") as f:
+            mcp_metadata = json.load(f)
+        mcp_servers: dict = mcp_metadata.get("mcpServers", {})
+
+        # 默认值
+        return {k: v|{
+            "transport": "stdio",
+        } for k,v in mcp_servers.items()}
+
+config_watcher = ConfigWatcher()
+
+__all__ = [
+    "ConfigSnapshot",
+    "ConfigWatcher",
+    "config_watcher",
+]
@@ -0,0 +1,65 @@
+from typing import List, Literal
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+
+ContextMode = Literal['full', 'tail', 'prefix_stable']
+
+def build_context(
+    messages: List[BaseMessage],
+    mode: ContextMode = 'full',
+    max_length: int = 50,
+    block_size: int = 10,
+) -> List[BaseMessage]:
+    """
+    根据记忆构建发送给 LLM 的消息列表
+    Args:
+        messages: 全部历史消息
+        mode: full 全部发送；tail 只保留最近 max_length 条；
+            prefix_stable 按 block_size 整块裁剪开头，使起点在多轮之间保持不变，
+            从而命中服务端的前缀缓存
+        max_length: 最大上下文长度
+        block_size: prefix_stable 模式下的裁剪粒度
+    Returns:
+        消息列表
+    """
+    if mode == 'full' or len(messages) <= max_length:
+        return messages
+    if mode == 'tail':
+        return messages[-max_length:]
+
+    # 起点只会按 block_size 跳变，期间每轮只在末尾追加，前缀保持不变
+    block_size = max(1, min(block_size, max_length))
+    overflow = len(messages) - max_length
+    start = -(-overflow // block_size) * block_size
+    return messages[start:]
+
+def build_retrieval_context(
+    messages: List[BaseMessage],
+    relevant: List[int],
+    recent: int = 20,
+) -> List[BaseMessage]:
+    """
+    相关历史 + 最近消息
+    Args:
+        messages: 全部历史消息
+        relevant: 检索到的相关消息位置，会连同所在问答对的另一半一起带上
+        recent: 始终保留的最近消息条数
+    Returns:
+        按原始顺序排列的消息列表
+    """
+    tail_start = max(0, len(messages) - recent)
+    selected = set()
+    for i in relevant:
+        if not 0 <= i < tail_start:
+            continue
+        selected.add(i)
+        if isinstance(messages[i], HumanMessage) and i + 1 < tail_start:
+            selected.add(i + 1)
+        elif isinstance(messages[i], AIMessage) and i > 0:
+            selected.add(i - 1)
+    return [messages[i] for i in sorted(selected)] + messages[tail_start:]
+
+__all__ = [
+    "ContextMode",
+    "build_context",
+    "build_retrieval_context",
+]
@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from ai_hub_agents import settings
+from .json_store import JsonStore
+
+class SnapshotExpired(Exception):
+    """请求的快照版本已不可用"""
+
+class HistorySnapshots:
+    """
+    线程历史的只读快照
+
+    通过 JsonStore.snapshot 无锁读取，不与正在写入的对话争用 FileLock。
+    最近读取的快照按 (thread_id, generation) 缓存，
+    分页导出时传回第一页拿到的 generation，即可在同一时间点上继续翻页。
+    """
+    def __init__(self, cache_size: int = 32):
+        self._cache: OrderedDict[tuple[str, int], list] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def page(self, thread_id: str, offset: int = 0, limit: int = 100, generation: int | None = None) -> dict:
+        """
+        分页读取
+        Args:
+            thread_id: 线程 ID
+            offset: 起始位置
+            limit: 条数
+            generation: 快照版本，为空时读取最新版本
+        Returns:
+            {"generation", "total", "offset", "messages", "next_offset"}
+        """
+        generation, messages = self._get(thread_id, generation)
+        page = messages[offset:offset + limit]
+        next_offset = offset + len(page)
+        if next_offset < len(messages):
+            # 还有后续页才缓存，单页读取不占用缓存
+            self._put(thread_id, generation, messages)
+        return {
+            "generation": generation,
+            "total": len(messages),
+            "offset": offset,
+            "messages": page,
+            "next_offset": next_offset if next_offset < len(messages) else None,
+        }
+
+    def _get(self, thread_id: str, generation: int | None) -> tuple[int, list]:
+        """取指定版本的快照"""
+        if generation is not None:
+            with self._lock:
+                cached = self._cache.get((thread_id, generation))
+                if cached is not None:
+                    self._cache.move_to_end((thread_id, generation))
+                    return generation, cached
+
+        store = JsonStore(Path(settings.data_dir) / thread_id / settings.memory_file_name)
+        current, messages = store.snapshot()
+        if not isinstance(messages, list):
+            messages = []
+        if generation is not None and generation != current:
+            raise SnapshotExpired(f"快照 {generation} 已过期，当前版本 {current}")
+        return current, messages
+
+    def _put(self, thread_id: str, generation: int, messages: list):
+        """缓存快照，淘汰最久未用的"""
+        with self._lock:
+            self._cache[(thread_id, generation)] = messages
+            self._cache.move_to_end((thread_id, generation))
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+history_snapshots = HistorySnapshots()
+
+__all__ = [
+    "SnapshotExpired",
+    "HistorySnapshots",
+    "history_snapshots",
+]
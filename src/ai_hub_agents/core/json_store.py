@@ -1,7 +1,13 @@
+import hashlib
 import json
+import time
 from pathlib import Path
+from typing import Any, Callable
 from filelock import FileLock
 
+SNAPSHOT_RETRIES = 20
+"""无锁读取读到不完整内容时的重试次数"""
+
 class JsonStore:
     def __init__(self, path: str):
         self.path = Path(path)
@@ -14,10 +20,64 @@ class JsonStore:
             with open(self.path, "r", encoding="utf-8") as f:
                 return json.load(f)
 
+    def snapshot(self) -> tuple[int, Any]:
+        """
+        不加锁读取一致的快照，返回 (generation, data)
+
+        写入通常是先写临时文件再原子替换，读到的内容要么是旧版本要么是新版本；
+        Windows 上替换失败时写入方会原地覆盖（见 _write），此时可能读到不完整的内容，
+        由读取方重试，写入方不会因为读取而失败。
+        generation 是内容的 48 位哈希（JSON 数字可精确表示），内容不同则版本不同，
+        不受文件时间戳精度影响。文件不存在时 generation 为 0。
+        """
+        for attempt in range(SNAPSHOT_RETRIES):
+            try:
+                with open(self.path, "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                return 0, {}
+            try:
+                data = json.loads(content.decode("utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                if attempt == SNAPSHOT_RETRIES - 1:
+                    raise
+                time.sleep(0.01 * (attempt + 1))
+                continue
+            generation = int.from_bytes(hashlib.blake2b(content, digest_size=6).digest(), "big") or 1
+            return generation, data
+
     def write(self, data: dict) -> None:
         with FileLock(self._lock_path, timeout=10):
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            tmp = self.path.with_suffix(".tmp")
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            tmp.replace(self.path)
\ No newline at end of file
+            self._write(data)
+
+    def update(self, func: Callable[[Any], Any]) -> Any:
+        """在同一把锁内读取、修改并写回；func 返回 None 时不写回"""
+        with FileLock(self._lock_path, timeout=10):
+            data = {}
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            data = func(data)
+            if data is not None:
+                self._write(data)
+            return data
+
+    def _write(self, data: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        content = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        with open(tmp, "wb") as f:
+            f.write(content)
+        for attempt in range(5):
+            try:
+                tmp.replace(self.path)
+                return
+            except PermissionError:
+                # Windows 上无锁读取方打开文件时无法替换，稍后重试
+                time.sleep(0.01 * (attempt + 1))
+        # 仍无法替换时原地覆盖（打开中的文件允许写入），先清空再写，
+        # 读取方只会读到空或不完整的内容并重试；写完后再删除临时文件，中途崩溃时仍可从中恢复
+        with open(self.path, "r+b") as f:
+            f.truncate()
+            f.write(content)
+        tmp.unlink(missing_ok=True)
\ No newline at end of file
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, List
+import openai
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_openai import ChatOpenAI
+from ai_hub_agents import settings
+from ai_hub_agents.settings import LLMEndpoint
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    是否是端点本身的问题（连接错误、超时、429、5xx）
+
+    其他错误（参数错误、上下文超长、鉴权失败等）换端点也不会成功，不切换也不计入熔断。
+    """
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+class EndpointState:
+    """单个 LLM 端点的运行状态"""
+    def __init__(self, endpoint: LLMEndpoint):
+        self.endpoint = endpoint
+        self.name = endpoint.name or f"{endpoint.model}@{endpoint.base_url}"
+        self.llm = ChatOpenAI(
+            model=endpoint.model,
+            api_key=endpoint.api_key or settings.llm_api_key,
+            base_url=endpoint.base_url,
+            max_retries=0,
+        )
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.ewma: float | None = None
+        self.failures = 0
+        self.open_until = 0.0
+        self.stats = {"requests": 0, "errors": 0, "hedged": 0, "hedge_wins": 0}
+
+    @property
+    def available(self) -> bool:
+        """熔断器是否允许请求（打开期过后进入半开状态，放行试探请求）"""
+        return time.monotonic() >= self.open_until
+
+    def score(self, default_latency: float) -> float:
+        """路由分数：权重 / 平均延迟（还没有样本时使用 default_latency）"""
+        return self.endpoint.weight / max(self.ewma or default_latency, 1e-3)
+
+    def p95(self) -> float | None:
+        """延迟 p95，样本不足时返回 None"""
+        if len(self.latencies) < 20:
+            return None
+        values = sorted(self.latencies)
+        return values[int(len(values) * 0.95) - 1]
+
+    def record_success(self, elapsed: float):
+        """记录成功"""
+        self.latencies.append(elapsed)
+        self.ewma = elapsed if self.ewma is None else 0.8 * self.ewma + 0.2 * elapsed
+        self.failures = 0
+
+    def record_failure(self):
+        """记录失败，连续失败达到阈值时熔断"""
+        self.stats["errors"] += 1
+        self.failures += 1
+        if self.failures >= settings.llm_breaker_threshold:
+            self.open_until = time.monotonic() + settings.llm_breaker_cooldown
+            logger.warning(f"LLM 端点熔断 {settings.llm_breaker_cooldown}s: {self.name}")
+
+    def collect(self) -> dict:
+        """指标"""
+        return {
+            **self.stats,
+            "ewma": self.ewma,
+            "p95": self.p95(),
+            "open": not self.available,
+        }
+
+class LLMRouter:
+    """
+    多端点 LLM 路由
+
+    按 权重/平均延迟 加权随机选择端点，每个端点独立熔断；
+    连接错误、超时、429、5xx 时换下一个端点重试（最多 llm_max_retries 次），其他错误直接抛出。
+    开启 llm_hedge 时，主请求超过该端点 p95 延迟仍未返回，
+    就向另一个端点发送相同请求，取先返回的结果并取消另一个。
+    """
+    def __init__(self):
+        self._states: list[EndpointState] = []
+        self._config: list[dict] | None = None
+
+    def endpoints(self) -> list[EndpointState]:
+        """当前端点（配置变化时重建）"""
+        # 运行时直接赋值的配置可能是 dict，统一转换
+        endpoints = [LLMEndpoint.model_validate(e) for e in settings.llm_endpoints]
+        config = [e.model_dump() for e in endpoints]
+        if config != self._config:
+            self._states = [EndpointState(e) for e in endpoints]
+            self._config = config
+        return self._states
+
+    def choose(self, exclude: set[str] = frozenset()) -> EndpointState | None:
+        """选择一个端点"""
+        candidates = [s for s in self.endpoints() if s.name not in exclude]
+        if not candidates:
+            return None
+        available = [s for s in candidates if s.available]
+        if not available:
+            # 全部熔断时选最早恢复的，作为半开试探
+            return min(candidates, key=lambda s: s.open_until)
+        # 没有样本的端点按已知最快延迟估计，保证会被尝试
+        known = [s.ewma for s in available if s.ewma is not None]
+        default_latency = min(known) if known else 1.0
+        return random.choices(available, weights=[s.score(default_latency) for s in available])[0]
+
+    async def agenerate(self, messages: List[BaseMessage], stop: list[str] | None = None, **kwargs) -> ChatResult:
+        """路由一次生成请求"""
+        tried: set[str] = set()
+        error: Exception | None = None
+        for _ in range(settings.llm_max_retries + 1):
+            primary = self.choose(tried)
+            if primary is None:
+                break
+            tried.add(primary.name)
+            try:
+                if settings.llm_hedge:
+                    return await self._hedged(primary, tried, messages, stop, **kwargs)
+                return await self._call(primary, messages, stop, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                logger.warning(f"LLM 请求失败，切换端点: {primary.name}: {e}")
+                error = e
+        raise error or RuntimeError("没有可用的 LLM 端点")
+
+    async def _call(self, state: EndpointState, messages: List[BaseMessage], stop, **kwargs) -> ChatResult:
+        """向单个端点发送请求并记录结果"""
+        state.stats["requests"] += 1
+        start = time.perf_counter()
+        try:
+            result = await state.llm._agenerate(messages, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            # 被对冲请求取消，不计入失败
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                state.record_failure()
+            raise
+        state.record_success(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, primary: EndpointState, tried: set[str], messages: List[BaseMessage], stop, **kwargs) -> ChatResult:
+        """对冲请求；返回或被取消时取消所有未完成的请求"""
+        delay = max(primary.p95() or 0.0, settings.llm_hedge_min_delay)
+        first = asyncio.create_task(self._call(primary, messages, stop, **kwargs))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            secondary = self.choose(tried)
+            if secondary is None or not secondary.available:
+                return await first
+            tried.add(secondary.name)
+            secondary.stats["hedged"] += 1
+            second = asyncio.create_task(self._call(secondary, messages, stop, **kwargs))
+            pending = {first, second}
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            secondary.stats["hedge_wins"] += 1
+                        return task.result()
+                    if not is_retryable(task.exception()):
+                        # 请求本身有问题，不必等另一个端点
+                        raise task.exception()
+            # 两个都失败
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def collect(self) -> dict:
+        """指标采集"""
+        return {state.name: state.collect() for state in self._states}
+
+llm_router = LLMRouter()
+metrics.register("llm", llm_router.collect)
+
+class RoutedChatModel(BaseChatModel):
+    """通过 LLMRouter 转发请求的聊天模型，可直接交给 create_agent"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-openai"
+
+    def bind_tools(self, tools, **kwargs):
+        """沿用 ChatOpenAI 的工具格式化，再绑定到自身"""
+        states = llm_router.endpoints()
+        if not states:
+            raise ValueError("llm_endpoints 不能为空")
+        bound = states[0].llm.bind_tools(tools, **kwargs)
+        return self.bind(**bound.kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return asyncio.run(self._agenerate(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return await llm_router.agenerate(messages, stop=stop, **kwargs)
+
+__all__ = [
+    "is_retryable",
+    "LLMRouter",
+    "RoutedChatModel",
+    "llm_router",
+]
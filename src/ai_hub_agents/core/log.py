@@ -1,11 +1,18 @@
+import atexit
+import json
 import logging
 import os
 import datetime
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import colorlog
 from colorama import init as colorama_init
 from typing import Literal
 from ai_hub_agents import settings
+from .metrics import metrics
 
 LEVEL_MAP = {
     'info': logging.INFO,
@@ -15,45 +22,164 @@ LEVEL_MAP = {
     'critical': logging.CRITICAL,
 }
 
+class JsonFormatter(logging.Formatter):
+    """
+    每条日志输出为一行 JSON
+
+    通过 extra 传入的 event（事件类型）和 fields（结构化字段）会展开到顶层。
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            data["event"] = event
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif getattr(record, "exc_fmt", None):
+            data["exc_info"] = record.exc_fmt
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class _QueueJsonFormatter(logging.Formatter):
+    """
+    入队前使用的格式化器
+
+    QueueHandler 入队时会丢弃 exc_info，这里先把异常栈单独保存，避免混入 message。
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        if record.exc_info:
+            record.exc_fmt = self.formatException(record.exc_info)
+        return record.getMessage()
+
+class EventSampler(logging.Filter):
+    """
+    按事件类型采样和限流
+
+    只处理通过 extra={"event": ...} 标记了事件类型的日志；WARNING 及以上总是保留。
+    限流为令牌桶，容量等于每秒条数。
+    """
+    def __init__(self, sample_rates: dict[str, float], rate_limits: dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate_limits = rate_limits
+        self._buckets: dict[str, tuple[float, float]] = {}
+        """事件类型 -> (剩余令牌, 上次补充时间)"""
+        self._lock = threading.Lock()
+        self.dropped: dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            return self._drop(event)
+        limit = self.rate_limits.get(event)
+        if limit is not None and not self._take(event, limit):
+            return self._drop(event)
+        return True
+
+    def _take(self, event: str, limit: float) -> bool:
+        """取一个令牌"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(event, (limit, now))
+            tokens = min(limit, tokens + (now - last) * limit)
+            if tokens < 1:
+                self._buckets[event] = (tokens, now)
+                return False
+            self._buckets[event] = (tokens - 1, now)
+            return True
+
+    def _drop(self, event: str) -> bool:
+        with self._lock:
+            self.dropped[event] = self.dropped.get(event, 0) + 1
+        return False
+
+    def collect(self) -> dict:
+        """指标：各事件类型被丢弃的条数"""
+        with self._lock:
+            return {"dropped": dict(self.dropped)}
+
+class _FanoutHandler(logging.Handler):
+    """同步模式下把记录分发给多个 handler，使采样过滤对每条记录只执行一次"""
+    def __init__(self, handlers: list[logging.Handler]):
+        super().__init__()
+        self.handlers = handlers
+
+    def emit(self, record: logging.LogRecord):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def close(self):
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+_listener: QueueListener | None = None
+
+def _stop_listener():
+    """停止后台写日志线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(_stop_listener)
+
 def setup_log(dir_name: str | None = None, level: Literal['info', 'debug', 'warning', 'error', 'critical'] = None):
-    """设置日志。无文件路径时仅输出到控制台。"""
+    """
+    设置日志。无文件路径时仅输出到控制台。
+
+    log_format 为 json 时输出结构化 JSON；log_async 为真时调用方只把日志放入队列，
+    由后台线程写控制台和文件；采样和限流在入队前完成。
+    """
+    global _listener
     # 默认值
     dir_name = dir_name or settings.log_dir
     level = level or settings.log_level
 
     log_level = LEVEL_MAP.get(level.lower(), logging.INFO)
+    json_mode = settings.log_format == 'json'
 
-    colorama_init()
-
-    color_formatter = colorlog.ColoredFormatter(
-        '%(log_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        log_colors={
-            'DEBUG': 'cyan',
-            'INFO': 'green',
-            'WARNING': 'yellow',
-            'ERROR': 'red',
-            'CRITICAL': 'red,bg_white',
-        }
-    )
+    if json_mode:
+        console_formatter = JsonFormatter()
+    else:
+        colorama_init()
+        console_formatter = colorlog.ColoredFormatter(
+            '%(log_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S',
+            log_colors={
+                'DEBUG': 'cyan',
+                'INFO': 'green',
+                'WARNING': 'yellow',
+                'ERROR': 'red',
+                'CRITICAL': 'red,bg_white',
+            }
+        )
 
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(color_formatter)
-
-    logger = logging.getLogger()
-    logger.setLevel(log_level)
-    logger.handlers.clear()
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(console_formatter)
+    handlers: list[logging.Handler] = [console_handler]
 
     if dir_name:
         date = datetime.datetime.now().strftime('%Y-%m-%d')
         time = datetime.datetime.now().strftime('%H-%M-%S')
         log_file = f"{dir_name}/{date}/{time}.log"
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        if json_mode:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
         file_handler = RotatingFileHandler(
             log_file,
             encoding='utf-8',
@@ -61,7 +187,33 @@ def setup_log(dir_name: str | None = None, level: Literal['info', 'debug', 'warn
             backupCount=5
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    sampler = EventSampler(settings.log_sample_rates, settings.log_rate_limits)
+    metrics.register("log", sampler.collect)
+
+    _stop_listener()
+    logger = logging.getLogger()
+    logger.setLevel(log_level)
+    logger.handlers.clear()
+    if settings.log_async:
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(sampler)
+        if json_mode:
+            queue_handler.setFormatter(_QueueJsonFormatter())
+        logger.addHandler(queue_handler)
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        fanout = _FanoutHandler(handlers)
+        fanout.addFilter(sampler)
+        logger.addHandler(fanout)
 
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
-    logging.getLogger('httpx').setLevel(logging.WARNING)
\ No newline at end of file
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+__all__ = [
+    "JsonFormatter",
+    "EventSampler",
+    "setup_log",
+]
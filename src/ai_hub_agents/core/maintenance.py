@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import shutil
+import tarfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncContextManager, Callable, Iterator
+from filelock import FileLock, Timeout
+from ai_hub_agents import settings
+from .json_store import JsonStore
+from .metrics import metrics
+from .usage import USAGE_FILE_NAME
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR_NAME = "_archive"
+"""归档目录名，data_dir 下以 _ 开头的目录不视为线程"""
+ORPHAN_MIN_AGE = 3600
+"""残留 .tmp/.lock 文件的最小存在时间（秒），避免误删正在使用的文件"""
+
+class MaintenanceScheduler:
+    """
+    data_dir 后台维护
+
+    每隔 maintenance_interval 秒扫描一遍线程目录：
+        空闲超过 thread_ttl_days 的线程直接删除；
+        空闲超过 thread_archive_days 的线程打包为 _archive/<thread_id>.<归档时间>.tar.gz 后删除；
+        记忆超过 memory_compact_length 条的线程只保留最近的消息；
+        清理 JsonStore 遗留的 .tmp 和没有数据文件的 .lock；
+        删除结束超过 batch_retention_days 的批处理任务目录。
+    文件操作在线程池中执行，每处理一个线程目录后按 maintenance_rate 限速，避免与请求争抢 IO。
+    维护期间持有该线程的请求锁（thread_lock），正在处理请求的线程本轮跳过。
+    """
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.thread_lock: Callable[[str], AsyncContextManager] | None = None
+        """thread_id -> 持有请求锁的上下文，由 app 设置"""
+        self.thread_busy: Callable[[str], bool] | None = None
+        """线程是否有请求正在处理或排队，由 app 设置"""
+        self._stats = {"runs": 0, "expired": 0, "archived": 0, "compacted": 0, "orphans_removed": 0, "batches_removed": 0, "last_run": None}
+
+    def start(self):
+        """启动后台任务"""
+        if settings.maintenance_interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """停止后台任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def collect(self) -> dict:
+        """指标采集"""
+        return dict(self._stats)
+
+    async def _loop(self):
+        """定时执行"""
+        while True:
+            await asyncio.sleep(settings.maintenance_interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("数据目录维护失败")
+
+    async def run_once(self):
+        """执行一轮维护"""
+        data_dir = Path(settings.data_dir)
+        if not data_dir.is_dir():
+            return
+        delay = 1 / settings.maintenance_rate if settings.maintenance_rate > 0 else 0
+        for thread_dir in sorted(data_dir.iterdir()):
+            if not thread_dir.is_dir() or thread_dir.name.startswith("_"):
+                continue
+            if self.thread_busy is not None and self.thread_busy(thread_dir.name):
+                continue
+            try:
+                if self.thread_lock is None:
+                    await asyncio.to_thread(self._maintain_thread, thread_dir)
+                else:
+                    async with self.thread_lock(thread_dir.name):
+                        await asyncio.to_thread(self._maintain_thread, thread_dir)
+            except Exception:
+                logger.exception(f"维护线程目录失败: {thread_dir}")
+            await asyncio.sleep(delay)
+        try:
+            await asyncio.to_thread(self._remove_old_batches, data_dir)
+        except Exception:
+            logger.exception("清理批处理任务失败")
+        self._stats["runs"] += 1
+        self._stats["last_run"] = time.time()
+
+    def _maintain_thread(self, thread_dir: Path):
+        """维护单个线程目录"""
+        self._stats["orphans_removed"] += self._remove_orphans(thread_dir)
+
+        idle = time.time() - self._last_modified(thread_dir)
+        if settings.thread_ttl_days > 0 and idle > settings.thread_ttl_days * 86400:
+            with self._hold_memory_lock(thread_dir) as held:
+                if held:
+                    self._clear(thread_dir)
+                    self._stats["expired"] += 1
+                    logger.info(f"删除过期线程: {thread_dir.name}")
+            if held:
+                self._remove_dir(thread_dir)
+            return
+        if settings.thread_archive_days > 0 and idle > settings.thread_archive_days * 86400:
+            with self._hold_memory_lock(thread_dir) as held:
+                if held:
+                    self._archive(thread_dir)
+                    self._clear(thread_dir)
+                    self._stats["archived"] += 1
+                    logger.info(f"归档冷线程: {thread_dir.name}")
+            if held:
+                self._remove_dir(thread_dir)
+            return
+        if settings.memory_compact_length > 0 and self._compact(thread_dir / settings.memory_file_name):
+            self._stats["compacted"] += 1
+            logger.info(f"压缩线程记忆: {thread_dir.name}")
+
+    @staticmethod
+    @contextmanager
+    def _hold_memory_lock(thread_dir: Path) -> Iterator[bool]:
+        """
+        尝试持有记忆锁直到退出，锁被占用（其他进程正在使用）时返回 False
+
+        删除和归档在持锁期间完成，避免与其他进程的读写交错。
+        """
+        lock = FileLock(str(thread_dir / settings.memory_file_name) + ".lock")
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _last_modified(thread_dir: Path) -> float:
+        """
+        线程数据文件的最近修改时间
+
+        只看数据文件：获取 FileLock 会截断 .lock 文件并刷新其 mtime，不能代表线程被使用。
+        """
+        data_files = [thread_dir / settings.memory_file_name, thread_dir / USAGE_FILE_NAME, *thread_dir.glob("index.*.jsonl")]
+        mtimes = [p.stat().st_mtime for p in data_files if p.is_file()]
+        return max(mtimes, default=thread_dir.stat().st_mtime)
+
+    @staticmethod
+    def _clear(thread_dir: Path):
+        """删除线程目录内除 .lock 以外的内容（持锁期间调用，Windows 上无法删除打开中的锁文件）"""
+        for path in thread_dir.iterdir():
+            if path.suffix == ".lock":
+                continue
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _remove_dir(thread_dir: Path):
+        """释放锁后删除剩余的锁文件和目录"""
+        for path in thread_dir.glob("*.lock"):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+        try:
+            thread_dir.rmdir()
+        except OSError:
+            # 释放锁后又有新请求写入，保留目录
+            pass
+
+    @staticmethod
+    def _archive(thread_dir: Path):
+        """打包线程目录（不删除原目录）"""
+        archive_dir = thread_dir.parent / ARCHIVE_DIR_NAME
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        # 同一 thread_id 可能被再次使用并再次归档，文件名带上时间，不覆盖之前的归档
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        target = archive_dir / f"{thread_dir.name}.{stamp}.tar.gz"
+        seq = 1
+        while target.exists():
+            target = archive_dir / f"{thread_dir.name}.{stamp}-{seq}.tar.gz"
+            seq += 1
+        tmp = target.with_suffix(".tmp")
+        with tarfile.open(tmp, "w:gz") as tar:
+            for path in thread_dir.rglob("*"):
+                if path.is_file() and path.suffix not in (".lock", ".tmp"):
+                    tar.add(path, arcname=path.relative_to(thread_dir.parent))
+        tmp.replace(target)
+
+    @staticmethod
+    def _compact(memory_path: Path) -> bool:
+        """只保留最近 memory_compact_length 条记忆"""
+        if not memory_path.exists():
+            return False
+
+        def compact(messages):
+            if not isinstance(messages, list) or len(messages) <= settings.memory_compact_length:
+                return None
+            return messages[-settings.memory_compact_length:]
+
+        return JsonStore(memory_path).update(compact) is not None
+
+    def _remove_old_batches(self, data_dir: Path):
+        """删除结束超过 batch_retention_days 的批处理任务"""
+        from ai_hub_agents.batch import BATCH_DIR_NAME
+
+        batch_dir = data_dir / BATCH_DIR_NAME
+        if settings.batch_retention_days <= 0 or not batch_dir.is_dir():
+            return
+        now = time.time()
+        for job_dir in batch_dir.iterdir():
+            state_path = job_dir / "state.json"
+            if not state_path.is_file():
+                continue
+            state = JsonStore(state_path).read()
+            if state.get("status") not in ("completed", "failed"):
+                continue
+            # 失败的任务没有 finished_at，以状态最后更新时间为准
+            finished_at = state.get("finished_at") or state_path.stat().st_mtime
+            if now - finished_at > settings.batch_retention_days * 86400:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                self._stats["batches_removed"] += 1
+                logger.info(f"删除过期批处理任务: {job_dir.name}")
+
+    @staticmethod
+    def _remove_orphans(thread_dir: Path) -> int:
+        """删除遗留的 .tmp 文件和没有数据文件的 .lock 文件"""
+        removed = 0
+        now = time.time()
+        for path in thread_dir.iterdir():
+            if path.suffix not in (".tmp", ".lock") or now - path.stat().st_mtime < ORPHAN_MIN_AGE:
+                continue
+            if path.suffix == ".lock":
+                if path.with_suffix("").exists():
+                    continue
+                lock = FileLock(str(path))
+                try:
+                    lock.acquire(timeout=0)
+                except Timeout:
+                    continue
+                try:
+                    path.unlink(missing_ok=True)
+                finally:
+                    lock.release()
+            else:
+                path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+maintenance_scheduler = MaintenanceScheduler()
+metrics.register("maintenance", maintenance_scheduler.collect)
+
+__all__ = [
+    "MaintenanceScheduler",
+    "maintenance_scheduler",
+]
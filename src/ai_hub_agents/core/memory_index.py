@@ -0,0 +1,212 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+from ai_hub_agents import settings
+
+class Embedder:
+    """向量化接口"""
+    name: str = "base"
+    """名称，用于区分不同向量化方式生成的索引文件"""
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """文本列表 -> 向量列表"""
+        raise NotImplementedError
+
+class HashingEmbedder(Embedder):
+    """
+    本地离线向量化
+
+    英文/数字按单词、中日韩文字按相邻二字切分后做特征哈希，无需模型和网络。
+    """
+    name = "hashing"
+    _TOKEN_RE = re.compile(r"[a-z0-9_]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in self._tokens(text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return _normalize(vector)
+
+    def _tokens(self, text: str) -> List[str]:
+        tokens = []
+        for word in self._TOKEN_RE.findall(text):
+            if word.isascii():
+                tokens.append(word)
+            elif len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        return tokens
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI 兼容的向量化接口，未单独配置时复用 LLM 的密钥和地址"""
+    name = "openai"
+
+    def __init__(self):
+        from langchain_openai import OpenAIEmbeddings
+        endpoint = settings.llm_endpoints[0] if settings.llm_endpoints else None
+        api_key = settings.embedding_api_key or settings.llm_api_key or (endpoint.api_key if endpoint else "")
+        base_url = settings.embedding_base_url or settings.llm_base_url or (endpoint.base_url if endpoint else "")
+        self._embeddings = OpenAIEmbeddings(
+            model=settings.embedding_model,
+            api_key=api_key,
+            base_url=base_url or None,
+        )
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [_normalize(v) for v in self._embeddings.embed_documents(texts)]
+
+EMBEDDERS: dict[str, type[Embedder]] = {
+    "hashing": HashingEmbedder,
+    "openai": OpenAIEmbedder,
+}
+"""可用的向量化方式，可注册自定义实现"""
+
+_embedder_cache: dict[str, Embedder] = {}
+
+def get_embedder(name: str | None = None) -> Embedder:
+    """按名称获取向量化实例（默认取 memory_index_embedder）"""
+    name = name or settings.memory_index_embedder
+    if name not in _embedder_cache:
+        if name not in EMBEDDERS:
+            raise ValueError(f"未知的向量化方式: {name}")
+        _embedder_cache[name] = EMBEDDERS[name]()
+    return _embedder_cache[name]
+
+def _normalize(vector: List[float]) -> List[float]:
+    """L2 归一化"""
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+def _text_hash(text: str) -> str:
+    """消息内容的短哈希，用于判断索引条目是否仍对应该位置的消息"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+class MemoryIndex:
+    """
+    线程记忆的向量索引
+
+    保存在 data_dir/<thread_id>/index.<embedder>.jsonl，每行 {"i": 消息位置, "h": 内容哈希, "v": 向量}。
+    新消息只追加；记忆被压缩后位置整体前移，哈希不再匹配，
+    此时按哈希复用已有向量、只为新内容向量化，并整体重写文件。
+    """
+    # 进程内 LRU 缓存：路径 -> (mtime_ns, {位置: (哈希, 向量)})
+    _cache: OrderedDict[Path, tuple[int, dict[int, tuple[str | None, List[float]]]]] = OrderedDict()
+    _cache_lock = threading.Lock()
+    CACHE_SIZE = 64
+    """缓存的线程索引数"""
+
+    def __init__(self, thread_dir: str | Path, embedder: Embedder | None = None):
+        self.embedder = embedder or get_embedder()
+        self.path = Path(thread_dir) / f"index.{self.embedder.name}.jsonl"
+
+    def sync(self, texts: List[str]):
+        """使索引与消息列表一致：补齐缺失的位置，内容已变（如被压缩）的位置重新对应"""
+        entries = self._load()
+        hashes = [_text_hash(text) for text in texts]
+        stale = any(i >= len(texts) or h != hashes[i] for i, (h, _v) in entries.items())
+        missing = [i for i in range(len(texts)) if i not in entries or entries[i][0] != hashes[i]]
+        if not stale and not missing:
+            return
+
+        # 按内容哈希复用已有向量
+        by_hash = {h: v for h, v in entries.values() if h is not None}
+        to_embed = [i for i in missing if hashes[i] not in by_hash]
+        if to_embed:
+            by_hash.update(zip((hashes[i] for i in to_embed), self.embedder.embed([texts[i] for i in to_embed])))
+        new_entries = {i: (hashes[i], [round(x, 5) for x in by_hash[hashes[i]]]) for i in missing}
+
+        if stale:
+            kept = {i: e for i, e in entries.items() if i < len(texts) and e[0] == hashes[i]}
+            self._rewrite({**kept, **new_entries})
+        else:
+            self._append(new_entries)
+
+    def search(self, query: str, top_k: int, before: int | None = None) -> List[int]:
+        """返回与 query 最相关的 top_k 个消息位置（只在 before 之前的位置中查找）"""
+        if top_k <= 0:
+            return []
+        q = self.embedder.embed([query])[0]
+        scored = [
+            (sum(a * b for a, b in zip(q, v)), i)
+            for i, (_h, v) in self._load().items()
+            if before is None or i < before
+        ]
+        scored.sort(reverse=True)
+        return [i for _score, i in scored[:top_k]]
+
+    def _load(self) -> dict[int, tuple[str | None, List[float]]]:
+        """读取索引（按 mtime 缓存）"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._cache_lock:
+            cached = self._cache.get(self.path)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(self.path)
+                return cached[1]
+        entries = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                # 旧格式没有哈希，视为失效
+                entries[item["i"]] = (item.get("h"), item["v"])
+        self._put_cache(mtime, entries)
+        return entries
+
+    def _put_cache(self, mtime: int, entries: dict[int, tuple[str | None, List[float]]]):
+        """写入缓存并淘汰最久未用的索引"""
+        with self._cache_lock:
+            self._cache[self.path] = (mtime, entries)
+            self._cache.move_to_end(self.path)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _line(i: int, h: str, v: List[float]) -> str:
+        return json.dumps({"i": i, "h": h, "v": v}, separators=(",", ":")) + "\n"
+
+    def _append(self, entries: dict[int, tuple[str, List[float]]]):
+        """追加写入，并同步更新缓存，避免下次整文件重读"""
+        cached = self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for i, (h, v) in entries.items():
+                f.write(self._line(i, h, v))
+        self._put_cache(self.path.stat().st_mtime_ns, {**cached, **entries})
+
+    def _rewrite(self, entries: dict[int, tuple[str, List[float]]]):
+        """整体重写索引文件"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for i in sorted(entries):
+                f.write(self._line(i, *entries[i]))
+        tmp.replace(self.path)
+        self._put_cache(self.path.stat().st_mtime_ns, dict(entries))
+
+__all__ = [
+    "Embedder",
+    "HashingEmbedder",
+    "OpenAIEmbedder",
+    "EMBEDDERS",
+    "get_embedder",
+    "MemoryIndex",
+]
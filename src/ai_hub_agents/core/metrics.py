@@ -0,0 +1,39 @@
+from typing import Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Metrics:
+    """
+    进程内指标
+
+    各模块注册一个返回 dict 的采集函数：
+        metrics.register("usage", usage_tracker.collect)
+
+    读取时统一采集：
+        metrics.collect() # {"usage": {...}, ...}
+    """
+    def __init__(self):
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, source: Callable[[], dict]):
+        """注册采集函数"""
+        self._sources[name] = source
+
+    def collect(self) -> dict:
+        """采集所有指标"""
+        result = {}
+        for name, source in self._sources.items():
+            try:
+                result[name] = source()
+            except Exception:
+                logger.exception(f"采集指标{name}失败")
+                result[name] = None
+        return result
+
+metrics = Metrics()
+
+__all__ = [
+    "Metrics",
+    "metrics",
+]
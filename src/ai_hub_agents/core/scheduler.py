@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Literal
+from ai_hub_agents import settings
+from .metrics import metrics
+
+Priority = Literal['interactive', 'batch']
+
+PRIORITY_RANK: dict[str, int] = {"interactive": 0, "batch": 1}
+"""优先级，数值越小越先调度"""
+
+class SchedulerRejected(Exception):
+    """预计排队时间超过截止时间，提前拒绝"""
+
+class FairScheduler:
+    """
+    加权公平调度
+
+    所有请求在执行前申请一个执行槽（并发上限 app_max_concurrency）。
+    槽不足时排队：先按优先级（interactive 先于 batch），
+    同优先级内按用户的虚拟完成时间排序（权重来自 scheduler_user_weights），
+    使某个用户开再多 thread_id 也只能分到自己那一份。
+    排队前根据平均执行时间估算等待时间，超过截止时间的请求直接拒绝。
+
+        async with fair_scheduler.slot(user_name, "interactive", deadline):
+            ...
+    """
+    def __init__(self):
+        self._running = 0
+        self._queue: list[tuple[int, float, int, asyncio.Future]] = []
+        self._queued: dict[int, int] = defaultdict(int)
+        """各优先级仍在等待的请求数（堆中已取消的条目要到堆顶才会移除，不能用 len(_queue)）"""
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: dict[str, float] = defaultdict(float)
+        self._service_time: float | None = None
+        self._waits: deque[float] = deque(maxlen=1000)
+        self._stats = {"admitted": 0, "rejected": 0}
+        self._user_admitted: dict[str, int] = defaultdict(int)
+
+    @property
+    def capacity(self) -> int:
+        """并发上限，<=0 表示不限制"""
+        return settings.app_max_concurrency
+
+    @asynccontextmanager
+    async def slot(self, user_name: str, priority: Priority = "interactive", deadline: float | None = None):
+        """
+        申请执行槽
+        Args:
+            user_name: 用户名称，公平分配的单位
+            priority: 优先级
+            deadline: 截止时间（loop.time()），预计等不到时抛出 SchedulerRejected
+        """
+        start = time.perf_counter()
+        await self._acquire(user_name, priority, deadline)
+        self._waits.append(time.perf_counter() - start)
+        self._stats["admitted"] += 1
+        self._user_admitted[user_name] += 1
+
+        exec_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe_service(time.perf_counter() - exec_start)
+            self._release()
+
+    def estimate_wait(self, priority: Priority = "interactive") -> float:
+        """估算新请求的排队时间（秒），只计算会排在它前面（优先级不低于它）的请求"""
+        if self.capacity <= 0 or self._running < self.capacity or self._service_time is None:
+            return 0.0
+        rank = PRIORITY_RANK.get(priority, 0)
+        ahead = sum(n for r, n in self._queued.items() if r <= rank)
+        return (ahead // self.capacity + 1) * self._service_time
+
+    def collect(self) -> dict:
+        """指标采集"""
+        waits = sorted(self._waits)
+        queued = self._queued
+        return {
+            **self._stats,
+            "running": self._running,
+            "capacity": self.capacity,
+            "queued": {name: queued[rank] for name, rank in PRIORITY_RANK.items()},
+            "avg_service_time": self._service_time,
+            "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+            "users": dict(self._user_admitted),
+        }
+
+    async def _acquire(self, user_name: str, priority: Priority, deadline: float | None):
+        """获取执行槽"""
+        if self.capacity <= 0 or (self._running < self.capacity and not self._pending()):
+            self._running += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        wait = self.estimate_wait(priority)
+        if deadline is not None and loop.time() + wait > deadline:
+            self._stats["rejected"] += 1
+            raise SchedulerRejected(f"预计排队 {wait:.1f}s，超过截止时间")
+
+        weight = settings.scheduler_user_weights.get(user_name, 1.0)
+        tag = max(self._virtual_time, self._finish_tags[user_name]) + 1 / max(weight, 1e-6)
+        self._finish_tags[user_name] = tag
+        future = loop.create_future()
+        rank = PRIORITY_RANK.get(priority, 0)
+        heapq.heappush(self._queue, (rank, tag, next(self._seq), future))
+        self._queued[rank] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被分配槽但调用方取消，交给下一个
+                self._release()
+            else:
+                future.cancel()
+                self._queued[rank] -= 1
+            raise
+
+    def _pending(self) -> bool:
+        """是否有未取消的排队请求"""
+        while self._queue and self._queue[0][3].done():
+            heapq.heappop(self._queue)
+        return bool(self._queue)
+
+    def _release(self):
+        """释放执行槽，转交给排在最前的请求"""
+        while self._queue:
+            rank, tag, _seq, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._queued[rank] -= 1
+            self._virtual_time = tag
+            future.set_result(None)
+            return
+        self._running -= 1
+
+    def _observe_service(self, elapsed: float):
+        """更新平均执行时间（指数移动平均）"""
+        if self._service_time is None:
+            self._service_time = elapsed
+        else:
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+
+fair_scheduler = FairScheduler()
+metrics.register("scheduler", fair_scheduler.collect)
+
+__all__ = [
+    "Priority",
+    "SchedulerRejected",
+    "FairScheduler",
+    "fair_scheduler",
+]
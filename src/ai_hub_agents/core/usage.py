@@ -0,0 +1,136 @@
+import threading
+import logging
+from pathlib import Path
+from ai_hub_agents import settings
+from .json_store import JsonStore
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+USAGE_FILE_NAME = "usage.json"
+"""用量文件名，与记忆文件放在同一线程目录下"""
+
+class TokenBudgetExceeded(Exception):
+    """线程 token 预算已用尽"""
+
+def empty_usage() -> dict:
+    """空用量"""
+    return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "cached_tokens": 0, "turns": 0}
+
+def add_usage(total: dict, input_tokens: int, output_tokens: int, cached_tokens: int = 0, turns: int = 1) -> dict:
+    """累加用量"""
+    total["input_tokens"] = total.get("input_tokens", 0) + input_tokens
+    total["output_tokens"] = total.get("output_tokens", 0) + output_tokens
+    total["total_tokens"] = total.get("total_tokens", 0) + input_tokens + output_tokens
+    total["cached_tokens"] = total.get("cached_tokens", 0) + cached_tokens
+    total["turns"] = total.get("turns", 0) + turns
+    return total
+
+def cache_hit_rate(usage: dict) -> float:
+    """前缀缓存命中率：cached_tokens / input_tokens"""
+    input_tokens = usage.get("input_tokens", 0)
+    return usage.get("cached_tokens", 0) / input_tokens if input_tokens else 0.0
+
+class UsageTracker:
+    """
+    token 用量统计
+
+    每个线程的用量持久化到 data_dir/<thread_id>/usage.json，
+    按用户的汇总由 load() 扫描所有线程文件（服务启动时在线程池中调用），之后在内存中累加。
+    读写文件的方法都是阻塞的，在事件循环中应通过 asyncio.to_thread 调用。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users: dict[str, dict] | None = None
+        self._total = empty_usage()
+
+    def _store(self, thread_id: str) -> JsonStore:
+        """线程用量存储"""
+        return JsonStore(Path(settings.data_dir) / thread_id / USAGE_FILE_NAME)
+
+    def thread_usage(self, thread_id: str) -> dict:
+        """线程用量：{"total": {...}, "users": {user_name: {...}}}"""
+        data = self._store(thread_id).read()
+        total = data.get("total", empty_usage())
+        return {
+            "total": total,
+            "cache_hit_rate": cache_hit_rate(total),
+            "users": data.get("users", {}),
+        }
+
+    def user_usage(self) -> dict[str, dict]:
+        """所有用户的用量"""
+        with self._lock:
+            self._ensure_users()
+            return {k: dict(v) for k, v in self._users.items()}
+
+    def load(self):
+        """扫描线程目录，初始化按用户的汇总"""
+        with self._lock:
+            self._ensure_users()
+
+    def record(self, thread_id: str, user_name: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0):
+        """记录一轮对话的用量"""
+        # 先完成按用户的初始化扫描，避免本轮用量被重复计入
+        self.load()
+
+        def update(data: dict) -> dict:
+            add_usage(data.setdefault("total", empty_usage()), input_tokens, output_tokens, cached_tokens)
+            add_usage(data.setdefault("users", {}).setdefault(user_name, empty_usage()), input_tokens, output_tokens, cached_tokens)
+            return data
+
+        self._store(thread_id).update(update)
+
+        with self._lock:
+            add_usage(self._users.setdefault(user_name, empty_usage()), input_tokens, output_tokens, cached_tokens)
+            add_usage(self._total, input_tokens, output_tokens, cached_tokens)
+
+    def check_budget(self, thread_id: str):
+        """超出线程预算时抛出 TokenBudgetExceeded"""
+        budget = settings.max_thread_tokens
+        if budget <= 0:
+            return
+        used = self.thread_usage(thread_id)["total"]["total_tokens"]
+        if used >= budget:
+            raise TokenBudgetExceeded(f"线程{thread_id}已用 {used} tokens，超出预算 {budget}")
+
+    def collect(self) -> dict:
+        """指标采集"""
+        return {
+            "process": dict(self._total),
+            "cache_hit_rate": cache_hit_rate(self._total),
+            "users": self.user_usage(),
+        }
+
+    def _ensure_users(self):
+        """扫描线程目录，初始化按用户的汇总（需持有锁）"""
+        if self._users is not None:
+            return
+        self._users = {}
+        data_dir = Path(settings.data_dir)
+        if not data_dir.is_dir():
+            return
+        for path in data_dir.glob(f"*/{USAGE_FILE_NAME}"):
+            try:
+                data = JsonStore(path).read()
+            except Exception:
+                logger.exception(f"读取用量失败: {path}")
+                continue
+            for user_name, usage in data.get("users", {}).items():
+                add_usage(
+                    self._users.setdefault(user_name, empty_usage()),
+                    usage.get("input_tokens", 0),
+                    usage.get("output_tokens", 0),
+                    usage.get("cached_tokens", 0),
+                    usage.get("turns", 0),
+                )
+
+usage_tracker = UsageTracker()
+metrics.register("usage", usage_tracker.collect)
+
+__all__ = [
+    "TokenBudgetExceeded",
+    "cache_hit_rate",
+    "UsageTracker",
+    "usage_tracker",
+]
@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+
+class FilePart(BaseModel):
+    filename: str = Field(..., description="文件名")
+    content: str = Field(..., description="文件内容")
+    type: str | None = Field(None, description="文件类型")
+
+class ResponseModel(BaseModel):
+    response: str = Field(..., description="响应文本")
+    files: list[FilePart] = Field(default_factory=list, description="文件列表")
+
+__all__ = [
+    "FilePart",
+    "ResponseModel",
+]
\ No newline at end of file
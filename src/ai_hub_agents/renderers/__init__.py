@@ -1,7 +1,27 @@
-from .event_monitor import EventMonitor
-from .app_serve import AppServe
+from typing import TYPE_CHECKING
+import importlib
+
+if TYPE_CHECKING:
+    from .event_monitor import EventMonitor
+    from .app_serve import AppServe
+    from .recorder import Recorder
+
+_LAZY_ATTRS = {
+    "EventMonitor": (".event_monitor", "EventMonitor"),
+    "AppServe": (".app_serve", "AppServe"),
+    "Recorder": (".recorder", "Recorder"),
+}
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_ATTRS[name]
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    globals()[name] = value
+    return value
 
 __all__ = [
     "EventMonitor",
     "AppServe",
-]
\ No newline at end of file
+    "Recorder",
+]
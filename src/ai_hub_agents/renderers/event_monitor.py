@@ -5,9 +5,11 @@ from ai_hub_agents.callback import (
     ToolCall,
     LoadMCPTools,
     AgentCreate,
+    TokenUsage,
     APIRequest,
     APIResponse,
 )
+from ai_hub_agents import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,6 +22,21 @@ Y = "\033[1;33m"   # 黄色 - 工具调用
 B = "\033[1;34m"   # 蓝色 - 工具响应
 M = "\033[1;35m"   # 洋红 - 加载 MCP
 
+def _log(event: str, color: str, message: str, **fields):
+    """
+    记录一条事件日志
+
+    event 通过 extra 传给日志系统用于采样限流；json 格式下不加颜色，fields 作为结构化字段输出。
+    """
+    if settings.log_format == 'json':
+        logger.info(message, extra={"event": event, "fields": fields})
+    else:
+        logger.info(f"{color}{message}{R}", extra={"event": event})
+
+def _preview(value, length: int) -> str:
+    """截断过长的文本"""
+    s = str(value)
+    return s[:length] + "..." if len(s) > length else s
 
 class EventMonitor:
     def __init__(self):
@@ -27,23 +44,29 @@ class EventMonitor:
 
         @UserQuery
         def _(cb: UserQuery):
-            logger.info(f"{C}💬 [用户] {cb.name}: {cb.query}{R}")
+            _log("UserQuery", C, f"💬 [用户] {cb.name}: {cb.query}", user_name=cb.name)
 
         @AssistantResponse
         def _(cb: AssistantResponse):
-            preview = cb.content[:100] + ("..." if len(cb.content) > 100 else "")
-            logger.info(f"{G}🤖 [助手回复]: {preview}{R}")
+            _log("AssistantResponse", G, f"🤖 [助手回复]: {_preview(cb.content, 100)}", length=len(cb.content))
 
         @ToolCall
         def _(cb: ToolCall):
-            s_args = " ".join(f"{k}={v}" for k, v in cb.args.items())
-            logger.info(f"{Y}🔧 [工具调用] {cb.tool_name} {s_args} {R}")
+            # 参数可能很大，只在 debug 时记录参数值
+            if logger.isEnabledFor(logging.DEBUG):
+                s_args = " ".join(f"{k}={v}" for k, v in cb.args.items())
+                _log("ToolCall", Y, f"🔧 [工具调用] {cb.tool_name} {s_args} ", tool=cb.tool_name, args=cb.args)
+            else:
+                _log("ToolCall", Y, f"🔧 [工具调用] {cb.tool_name} {' '.join(cb.args)} ", tool=cb.tool_name, arg_names=list(cb.args))
 
         @ToolResponse
         def _(cb: ToolResponse):
+            # 工具结果可能很大，只在 debug 时记录内容
             s = str(cb.result)
-            preview = s[:80] + "..." if len(s) > 80 else s
-            logger.info(f"{B}✅ [工具响应] {cb.tool_name}: {preview}{R}")
+            if logger.isEnabledFor(logging.DEBUG):
+                _log("ToolResponse", B, f"✅ [工具响应] {cb.tool_name}: {_preview(s, 80)}", tool=cb.tool_name, result=s)
+            else:
+                _log("ToolResponse", B, f"✅ [工具响应] {cb.tool_name}: {len(s)} 字符", tool=cb.tool_name, length=len(s))
 
         @LoadMCPTools
         def _(cb: LoadMCPTools):
@@ -52,11 +75,20 @@ class EventMonitor:
             else:
                 return
             s_tool_names = " ".join(cb.tool_names)
-            logger.info(f"{M}📦 [加载 MCP 工具] {s_tool_names}{R}")
+            _log("LoadMCPTools", M, f"📦 [加载 MCP 工具] {s_tool_names}", tools=cb.tool_names)
 
         @AgentCreate
         def _(cb: AgentCreate):
-            logger.info(f"{M}📦 [创建代理] {cb.thread_id}{R}")
+            _log("AgentCreate", M, f"📦 [创建代理] {cb.thread_id}", thread_id=cb.thread_id)
+
+        @TokenUsage
+        def _(cb: TokenUsage):
+            _log(
+                "TokenUsage", M,
+                f"📊 [token 用量] {cb.thread_id} {cb.user_name}: 输入 {cb.input_tokens} 输出 {cb.output_tokens} 缓存 {cb.cached_tokens}",
+                thread_id=cb.thread_id, user_name=cb.user_name,
+                input_tokens=cb.input_tokens, output_tokens=cb.output_tokens, cached_tokens=cb.cached_tokens,
+            )
 
         @APIRequest
         def _(cb: APIRequest):
@@ -64,7 +96,10 @@ class EventMonitor:
                 s_files = '[' + ", ".join(f"{f.filename}" for f in cb.files) + ']'
             else:
                 s_files = ""
-            logger.info(f"{M}📥 [API请求] {cb.thread_id}: {cb.query[:100]} {s_files}{R}")
+            _log(
+                "APIRequest", M, f"📥 [API请求] {cb.thread_id}: {cb.query[:100]} {s_files}",
+                thread_id=cb.thread_id, file_count=len(cb.files or []),
+            )
 
         @APIResponse
         def _(cb: APIResponse):
@@ -72,4 +107,7 @@ class EventMonitor:
                 s_files = '[' + ", ".join(f"{f.filename}" for f in cb.files) + ']'
             else:
                 s_files = ""
-            logger.info(f"{M}📩 [API响应] {cb.thread_id}: {cb.response[:100]} {s_files}{R}")
\ No newline at end of file
+            _log(
+                "APIResponse", M, f"📩 [API响应] {cb.thread_id}: {cb.response[:100]} {s_files}",
+                thread_id=cb.thread_id, file_count=len(cb.files or []),
+            )
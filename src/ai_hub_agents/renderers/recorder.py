@@ -0,0 +1,154 @@
+from ai_hub_agents.callback import (
+    APIRequest,
+    APIResponse,
+    LLMResponse,
+    ToolCall,
+    ToolResponse,
+    AssistantResponse,
+)
+from contextvars import ContextVar
+from pathlib import Path
+import atexit
+import gzip
+import hashlib
+import json
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 当前请求正在记录的轨迹，按 asyncio 任务隔离
+_trace: ContextVar[dict | None] = ContextVar("recorder_trace", default=None)
+
+def open_trace(path: str | Path, mode: str = "rt"):
+    """打开轨迹文件，.gz 结尾时使用 gzip"""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode.replace("t", ""), encoding="utf-8")
+
+def load_traces(path: str | Path) -> list[dict]:
+    """读取轨迹文件"""
+    with open_trace(path, "rt") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class Recorder:
+    """
+    请求录制
+
+    把每个 APIRoundtrip 的请求字段、LLM 调用（输入消息条数和哈希、响应）、工具调用与结果记录为一行 JSON，
+    追加写入轨迹文件（.gz 结尾时压缩），供 ai_hub_agents.replay 离线回放。
+    请求结束时只把轨迹放入队列，由后台线程序列化并按批写入（gzip 每批一个 member）。
+    """
+    BATCH_SIZE = 256
+    """每批最多写入的轨迹数"""
+    FLUSH_INTERVAL = 1.0
+    """凑批的最长等待时间（秒）"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: queue.SimpleQueue[dict | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="recorder", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+        @APIRequest
+        def _(cb: APIRequest):
+            _trace.set({
+                "thread_id": cb.thread_id,
+                "query": cb.query,
+                "user_name": cb.user_name,
+                "started_at": time.time(),
+                "events": [],
+            })
+
+        @LLMResponse
+        def _(cb: LLMResponse):
+            from langchain_core.messages import message_to_dict
+            # 输入消息在写入线程中再计算条数和哈希
+            self._append({"type": "llm", "elapsed": round(cb.elapsed, 4), "message": message_to_dict(cb.message), "input": cb.input_messages})
+
+        @ToolCall
+        def _(cb: ToolCall):
+            self._append({"type": "tool_call", "tool_name": cb.tool_name, "args": cb.args})
+
+        @ToolResponse
+        def _(cb: ToolResponse):
+            self._append({"type": "tool_result", "tool_name": cb.tool_name, "result": cb.result})
+
+        @AssistantResponse
+        def _(cb: AssistantResponse):
+            self._append({"type": "response", "content": cb.content})
+
+        @APIResponse
+        def _(cb: APIResponse):
+            trace = _trace.get()
+            if trace is None:
+                return
+            _trace.set(None)
+            trace["duration"] = round(time.time() - trace["started_at"], 4)
+            self._queue.put(trace)
+
+    def _append(self, event: dict):
+        """追加事件到当前轨迹"""
+        trace = _trace.get()
+        if trace is None:
+            return
+        event["t"] = round(time.time() - trace["started_at"], 4)
+        trace["events"].append(event)
+
+    def close(self):
+        """写完队列中剩余的轨迹并停止写入线程"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _writer(self):
+        """写入线程：凑批后一次写入"""
+        stopped = False
+        while not stopped:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, traces: list[dict]):
+        """序列化并写入一批轨迹"""
+        try:
+            lines = "".join(self._dumps(trace) + "\n" for trace in traces)
+            with open_trace(self.path, "at") as f:
+                f.write(lines)
+        except Exception:
+            logger.exception(f"写入轨迹失败: {self.path}")
+
+    @staticmethod
+    def _dumps(trace: dict) -> str:
+        """序列化一条轨迹，LLM 输入消息替换为条数和哈希"""
+        from langchain_core.messages import message_to_dict
+        for event in trace["events"]:
+            if event["type"] == "llm" and isinstance(event.get("input"), list):
+                data = json.dumps([message_to_dict(m) for m in event["input"]], ensure_ascii=False, default=str, sort_keys=True)
+                event["input"] = {
+                    "count": len(event["input"]),
+                    "hash": hashlib.sha1(data.encode("utf-8")).hexdigest(),
+                }
+        return json.dumps(trace, ensure_ascii=False, default=str, separators=(",", ":"))
+
+__all__ = [
+    "Recorder",
+    "load_traces",
+]
@@ -0,0 +1,204 @@
+"""
+离线回放
+
+用 Recorder 录制的轨迹驱动服务端处理流程（app.handle_request）：LLM 和工具都替换为录制下来的响应，
+按指定速度和并发重放请求，得到可复现、无需联网的压测结果。
+
+    python -m ai_hub_agents.replay trace.jsonl --speed 2 --concurrency 16
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+from contextvars import ContextVar
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import Field
+from ai_hub_agents import settings
+from ai_hub_agents.callback import APIResponse, APIRoundtrip
+from ai_hub_agents.renderers.recorder import load_traces
+
+logger = logging.getLogger(__name__)
+
+# 当前回放的轨迹
+_current: ContextVar[dict | None] = ContextVar("replay_trace", default=None)
+
+class ReplayChatModel(BaseChatModel):
+    """按顺序返回录制的 AI 消息"""
+    responses: list[AIMessage] = Field(default_factory=list)
+    """录制的 AI 消息"""
+    delays: list[float] = Field(default_factory=list)
+    """每条消息的原始耗时（秒）"""
+    speed: float = 1.0
+    """回放速度，<=0 时不等待"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, **kwargs):
+        """工具调用已录制在消息里，无需绑定"""
+        return self
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError("回放模型只支持异步调用")
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if not self.responses:
+            raise RuntimeError("录制的 LLM 响应已用尽")
+        message = self.responses.pop(0)
+        delay = self.delays.pop(0) if self.delays else 0
+        if self.speed > 0 and delay > 0:
+            await asyncio.sleep(delay / self.speed)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+def build_tools(trace: dict, speed: float) -> list[BaseTool]:
+    """为轨迹中出现的每个工具构造返回录制结果的替身"""
+    results: dict[str, list[tuple[float, Any]]] = {}
+    last_call: dict[str, float] = {}
+    for event in trace["events"]:
+        if event["type"] == "tool_call":
+            last_call[event["tool_name"]] = event["t"]
+        elif event["type"] == "tool_result":
+            delay = event["t"] - last_call.get(event["tool_name"], event["t"])
+            results.setdefault(event["tool_name"], []).append((delay, event["result"]))
+
+    tools = []
+    for name, queue in results.items():
+        async def replay_tool(_queue=queue, _name=name, **kwargs):
+            if not _queue:
+                raise RuntimeError(f"录制的工具结果已用尽: {_name}")
+            delay, result = _queue.pop(0)
+            if speed > 0 and delay > 0:
+                await asyncio.sleep(delay / speed)
+            return result
+
+        tools.append(StructuredTool.from_function(
+            coroutine=replay_tool,
+            name=name,
+            description=f"回放工具 {name}",
+            args_schema={"type": "object", "properties": {}, "additionalProperties": True},
+        ))
+    return tools
+
+def build_llm(trace: dict, speed: float) -> ReplayChatModel:
+    """由轨迹构造回放模型"""
+    events = [e for e in trace["events"] if e["type"] == "llm"]
+    return ReplayChatModel(
+        responses=messages_from_dict([e["message"] for e in events]),
+        delays=[e.get("elapsed", 0) for e in events],
+        speed=speed,
+    )
+
+class ReplayServe:
+    """替代 AppServe：用当前轨迹的录制响应构造 Agent"""
+    def __init__(self, speed: float):
+        from ai_hub_agents import Agent
+
+        @APIRoundtrip
+        async def _(cb: APIRoundtrip):
+            trace = _current.get()
+            agent = Agent(
+                thread_id=cb.request.thread_id,
+                llm=build_llm(trace, speed),
+                tools=build_tools(trace, speed),
+            )
+            response = await agent.run(query=cb.request.query, user_name=cb.request.user_name)
+            cb.response = APIResponse.trigger(
+                thread_id=cb.request.thread_id,
+                response=response,
+                files=[],
+            )
+
+async def replay(traces: list[dict], speed: float = 1.0, concurrency: int = 8) -> dict:
+    """
+    回放轨迹
+    Args:
+        traces: 轨迹列表
+        speed: 回放速度，按录制时的到达间隔和耗时缩放；<=0 时尽快发送且不等待
+        concurrency: 最大并发请求数
+    Returns:
+        统计结果
+    """
+    from fastapi import HTTPException
+    from ai_hub_agents.app import handle_request
+
+    ReplayServe(speed)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors: list[str] = []
+    traces = sorted(traces, key=lambda t: t["started_at"])
+    origin = traces[0]["started_at"] if traces else 0
+    begin = time.perf_counter()
+
+    async def one(trace: dict):
+        if speed > 0:
+            await asyncio.sleep(max(0, (trace["started_at"] - origin) / speed - (time.perf_counter() - begin)))
+        async with semaphore:
+            _current.set(trace)
+            start = time.perf_counter()
+            try:
+                await handle_request(trace["thread_id"], trace["query"], [], trace["user_name"])
+                latencies.append(time.perf_counter() - start)
+            except HTTPException as e:
+                errors.append(f"{trace['thread_id']}: {e.status_code} {e.detail}")
+            except Exception as e:
+                logger.exception(f"回放失败: {trace['thread_id']}")
+                errors.append(f"{trace['thread_id']}: {e}")
+
+    await asyncio.gather(*(one(trace) for trace in traces))
+    elapsed = time.perf_counter() - begin
+    return {
+        "requests": len(traces),
+        "errors": len(errors),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "error_details": errors,
+    }
+
+def _percentile(values: list[float], p: float) -> float:
+    """百分位数"""
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+def get_args() -> argparse.Namespace:
+    """获取命令行参数"""
+    parser = argparse.ArgumentParser(description='AI Hub Agents 离线回放')
+    parser.add_argument('trace', type=str, help='轨迹文件（.jsonl 或 .jsonl.gz）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放速度，<=0 时尽快发送')
+    parser.add_argument('--concurrency', type=int, default=8, help='最大并发请求数')
+    parser.add_argument('--data-dir', type=str, default=None, help='数据目录，默认使用临时目录')
+    parser.add_argument('--repeat', type=int, default=1, help='重复轨迹的次数')
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    settings.data_dir = args.data_dir or tempfile.mkdtemp(prefix="ai-hub-replay-")
+    traces = load_traces(args.trace) * args.repeat
+    result = asyncio.run(replay(traces, speed=args.speed, concurrency=args.concurrency))
+    for detail in result.pop("error_details"):
+        print(f"[ERROR] {detail}")
+    print(
+        f"requests={result['requests']} errors={result['errors']} elapsed={result['elapsed']:.2f}s "
+        f"throughput={result['throughput']:.2f}/s p50={result['p50']*1000:.0f}ms "
+        f"p95={result['p95']*1000:.0f}ms p99={result['p99']*1000:.0f}ms"
+    )
+
+if __name__ == "__main__":
+    main()
+
+__all__ = [
+    "ReplayChatModel",
+    "replay",
+]
@@ -1,8 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import Literal
 from pathlib import Path
-import yaml
 
 def find_env_file() -> Path | None:
     """从当前文件所在目录开始，逐层向上查找 .env"""
@@ -13,6 +12,19 @@ def find_env_file() -> Path | None:
             return env_file
     return None
 
+class LLMEndpoint(BaseModel):
+    """LLM 端点"""
+    base_url: str
+    """基础 URL"""
+    model: str
+    """模型"""
+    api_key: str = ""
+    """API 密钥，为空时使用 llm_api_key"""
+    weight: float = 1.0
+    """路由权重"""
+    name: str = ""
+    """名称，为空时使用 model@base_url"""
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=find_env_file(),
@@ -25,12 +37,32 @@ class Settings(BaseSettings):
     """LLM 基础 URL"""
     llm_model: str = ""
     """LLM 模型"""
+    llm_endpoints: list[LLMEndpoint] = Field(default_factory=list)
+    """多个 LLM 端点，非空时按延迟和权重路由并自动故障转移，忽略 llm_base_url / llm_model"""
+    llm_max_retries: int = 2
+    """请求失败时切换端点重试的次数"""
+    llm_breaker_threshold: int = 3
+    """端点连续失败多少次后熔断"""
+    llm_breaker_cooldown: float = 30.0
+    """熔断持续时间（秒）"""
+    llm_hedge: bool = False
+    """是否启用对冲请求：主请求超过 p95 延迟未返回时向另一端点发送副本"""
+    llm_hedge_min_delay: float = 1.0
+    """对冲请求的最小等待时间（秒），延迟样本不足时使用"""
 
     # bootstrap
     log_dir: str|None = Field(default=None)
     """日志目录"""
     log_level: Literal['info', 'debug', 'warning', 'error', 'critical']='info'
     """日志级别"""
+    log_format: Literal['text', 'json'] = 'text'
+    """日志格式：text 彩色文本；json 每行一个 JSON 对象，不含 ANSI 颜色"""
+    log_async: bool = True
+    """是否通过队列在后台线程写日志"""
+    log_sample_rates: dict[str, float] = Field(default_factory=dict)
+    """按事件类型采样的保留比例，如 {"ToolResponse": 0.1}；未配置的事件全部保留"""
+    log_rate_limits: dict[str, float] = Field(default_factory=dict)
+    """按事件类型限制每秒最多记录的条数，如 {"ToolCall": 20}"""
     data_dir: str = "data"
     """数据目录"""
     mcp_path: str = "mcp.json"
@@ -41,6 +73,42 @@ class Settings(BaseSettings):
     """提示词路径"""
     max_context_length: int = 50
     """最大上下文长度"""
+    context_mode: Literal['full', 'tail', 'prefix_stable'] = 'full'
+    """上下文构建模式：full 全部发送，tail 保留最近消息，prefix_stable 整块裁剪以命中前缀缓存"""
+    context_block_size: int = 10
+    """prefix_stable 模式下的裁剪粒度（消息条数）"""
+    max_thread_tokens: int = 0
+    """单个线程的 token 预算，<=0 表示不限制"""
+    memory_index: bool = False
+    """是否启用记忆向量检索，启用后上下文为相关历史 + 最近消息，忽略 context_mode"""
+    memory_index_embedder: str = 'hashing'
+    """向量化方式：hashing 本地离线，openai 调用兼容接口，或通过 EMBEDDERS 注册的自定义名称"""
+    embedding_model: str = "text-embedding-3-small"
+    """openai 向量化模型"""
+    embedding_api_key: str = ""
+    """openai 向量化密钥，为空时依次使用 llm_api_key、第一个 llm_endpoints 的密钥"""
+    embedding_base_url: str = ""
+    """openai 向量化地址，为空时依次使用 llm_base_url、第一个 llm_endpoints 的地址"""
+    memory_index_top_k: int = 5
+    """检索的相关消息条数"""
+    memory_index_recent: int = 20
+    """启用检索时始终保留的最近消息条数"""
+    config_poll_interval: float = 2.0
+    """配置文件轮询间隔（秒），<=0 时不热重载"""
+
+    # maintenance
+    maintenance_interval: float = 3600.0
+    """数据目录维护间隔（秒），<=0 时不启用"""
+    maintenance_rate: float = 20.0
+    """维护时每秒最多处理的线程目录数"""
+    thread_ttl_days: float = 0
+    """线程空闲超过该天数后删除，<=0 表示不删除"""
+    thread_archive_days: float = 0
+    """线程空闲超过该天数后归档为压缩包，<=0 表示不归档"""
+    memory_compact_length: int = 0
+    """记忆超过该条数时只保留最近的消息，<=0 表示不压缩"""
+    batch_retention_days: float = 7
+    """已结束（完成或失败）的批处理任务保留天数，之后删除输入和结果文件；<=0 表示不删除"""
 
     # server
     host: str = "0.0.0.0"
@@ -53,21 +121,55 @@ class Settings(BaseSettings):
     """APP 队列超时时间"""
     app_exec_timeout: float = 120.0
     """APP 执行超时时间"""
+    app_max_concurrency: int = 16
+    """同时执行的请求数上限，超出时按用户加权公平排队；<=0 表示不限制"""
+    scheduler_user_weights: dict[str, float] = Field(default_factory=dict)
+    """用户调度权重，未配置的用户为 1"""
+    batch_concurrency: int = 4
+    """批处理任务的并发请求数"""
+    record_path: str|None = None
+    """请求录制文件路径（.jsonl 或 .jsonl.gz），为空时不录制"""
+    tool_default_execution: Literal['inline', 'thread', 'process'] = 'inline'
+    """本地工具默认执行方式：inline 在事件循环中执行；thread 线程池；process 常驻进程池"""
+    tool_execution: dict[str, dict] = Field(default_factory=dict)
+    """按工具名覆盖执行策略，如 {"get_current_time": {"mode": "thread", "timeout": 5}}；可设置 mode、timeout、memory_mb"""
+    tool_timeout: float = 60.0
+    """线程池/进程池中工具的默认超时时间（秒）"""
+    tool_thread_workers: int = 8
+    """工具线程池大小"""
+    tool_process_workers: int = 2
+    """工具进程池大小"""
 
 settings = Settings()
 
+_settings_path: str | None = None
+
+def settings_path() -> str | None:
+    """当前加载的配置文件路径"""
+    return _settings_path
+
 def load_settings(input_yaml:str|None):
     """加载配置文件"""
-    global settings
+    global settings, _settings_path
 
     if input_yaml:
+        import yaml
+
+        _settings_path = input_yaml
         with open(input_yaml) as f:
             local_overrides = yaml.safe_load(f)
-        for key, value in local_overrides.items():
-            if hasattr(settings, key):
-                setattr(settings, key, value)
+        # 按字段类型校验转换（如 llm_endpoints 的 dict -> LLMEndpoint），全部通过后再应用
+        validated = {
+            key: TypeAdapter(Settings.model_fields[key].annotation).validate_python(value)
+            for key, value in (local_overrides or {}).items()
+            if key in Settings.model_fields
+        }
+        for key, value in validated.items():
+            setattr(settings, key, value)
 
 __all__ = [
+    "LLMEndpoint",
     "settings",
     "load_settings",
+    "settings_path",
 ]
\ No newline at end of file
@@ -2,11 +2,12 @@ import importlib.util
 from pathlib import Path
 from langchain_core.tools import BaseTool
 import logging
+from ._executor import execution, tool_executor
 
 logger = logging.getLogger(__name__)
 
 def load_tools_from_directory(dir_path: str | Path) -> list[BaseTool]:
-    """从目录下所有 .py 脚本动态加载并收集所有 BaseTool"""
+    """从目录下所有 .py 脚本动态加载并收集所有 BaseTool，按执行策略包装"""
     dir_path = Path(dir_path)
     tools: list[BaseTool] = []
 
@@ -30,11 +31,18 @@ def load_tools_from_directory(dir_path: str | Path) -> list[BaseTool]:
         for name in dir(module):
             obj = getattr(module, name)
             if isinstance(obj, BaseTool):
-                tools.append(obj)
+                tools.append(tool_executor.wrap(obj, source=(str(file), name)))
             # 若用 @tool 装饰，得到的是 StructuredTool，也是 BaseTool 子类
 
     return tools
 
 def get_all_tools() -> list[BaseTool]:
     """获取所有工具"""
-    return load_tools_from_directory(Path(__file__).parent)
\ No newline at end of file
+    return load_tools_from_directory(Path(__file__).parent)
+
+__all__ = [
+    "execution",
+    "tool_executor",
+    "load_tools_from_directory",
+    "get_all_tools",
+]
@@ -0,0 +1,281 @@
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Literal
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from ai_hub_agents import settings
+from ai_hub_agents.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ExecutionMode = Literal['inline', 'thread', 'process']
+
+class ToolTimeout(ToolException):
+    """工具在线程池/进程池中执行超时"""
+
+def execution(mode: ExecutionMode = "thread", timeout: float | None = None, memory_mb: int | None = None):
+    """
+    设置工具的执行策略，放在 @tool 之上：
+
+        @execution("process", timeout=10, memory_mb=512)
+        @tool
+        def heavy(...): ...
+
+    Args:
+        mode: inline 在事件循环中直接执行；thread 在线程池执行；process 在常驻进程池执行
+        timeout: 超时时间（秒），为空时使用 tool_timeout
+        memory_mb: 内存上限（MB），仅 process 模式且支持 resource 的系统生效
+    """
+    def decorator(tool: BaseTool) -> BaseTool:
+        tool.metadata = {**(tool.metadata or {}), "execution": {"mode": mode, "timeout": timeout, "memory_mb": memory_mb}}
+        return tool
+    return decorator
+
+# 子进程内已加载的工具：(文件, 属性名) -> 工具
+_process_tools: dict[tuple[str, str], BaseTool] = {}
+
+def _warmup() -> None:
+    """预热子进程"""
+
+def _run_in_process(file: str, attr: str, args: dict, memory_mb: int | None) -> Any:
+    """在子进程中加载并执行工具"""
+    key = (file, attr)
+    if key not in _process_tools:
+        spec = importlib.util.spec_from_file_location(f"_tool_{abs(hash(file))}", file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _process_tools[key] = getattr(module, attr)
+
+    limits = None
+    if memory_mb:
+        try:
+            import resource
+            limits = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, limits[1]))
+        except (ImportError, ValueError, OSError):
+            limits = None
+    try:
+        return _process_tools[key].invoke(args)
+    except MemoryError as e:
+        raise ToolException(f"工具超出内存限制（{memory_mb}MB）") from e
+    finally:
+        if limits is not None:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, limits)
+
+class _PoolStats:
+    """
+    执行池统计
+
+    active 和 busy_time 以任务在池中实际结束为准：超时后调用方不再等待，
+    但线程池中的任务仍在运行并占用工作线程，计入 timed_out_running。
+    """
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.active = 0
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.timed_out_running = 0
+        self.busy_time = 0.0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._running: dict[Future, float] = {}
+        """运行中的任务 -> 开始时间"""
+        self._timed_out: set[Future] = set()
+        """调用方已超时但仍在运行的任务"""
+
+    def track(self, future: Future):
+        """开始跟踪一个任务，任务结束时（在工作线程或进程池管理线程中）更新统计"""
+        with self._lock:
+            self.active += 1
+            self._running[future] = time.monotonic()
+        future.add_done_callback(self._done)
+
+    def mark_timeout(self, future: Future):
+        """调用方等待超时"""
+        with self._lock:
+            self.timeouts += 1
+            if future in self._running:
+                self.timed_out_running += 1
+                self._timed_out.add(future)
+
+    def _done(self, future: Future):
+        with self._lock:
+            start = self._running.pop(future, None)
+            if start is None:
+                return
+            self.active -= 1
+            self.busy_time += time.monotonic() - start
+            if future in self._timed_out:
+                self._timed_out.discard(future)
+                self.timed_out_running -= 1
+            elif future.cancelled():
+                # 排队中被取消，未实际执行
+                pass
+            elif future.exception() is not None:
+                self.errors += 1
+            else:
+                self.completed += 1
+
+    def collect(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            # 加上运行中任务已经占用的时间
+            busy = self.busy_time + sum(now - start for start in self._running.values())
+            elapsed = now - self.started_at
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "completed": self.completed,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "timed_out_running": self.timed_out_running,
+                "utilization": busy / (elapsed * self.workers) if elapsed and self.workers else 0.0,
+            }
+
+class ToolExecutor:
+    """
+    按工具执行策略调度本地工具
+
+    策略来源（优先级从高到低）：settings.tool_execution[工具名]、@execution 装饰器、tool_default_execution。
+    同步工具在 inline 模式下会阻塞事件循环，CPU 密集或阻塞的工具应使用 thread / process。
+    """
+    def __init__(self):
+        self._thread_pool: ThreadPoolExecutor | None = None
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._stats: dict[str, _PoolStats] = {}
+
+    def policy(self, tool: BaseTool) -> dict:
+        """工具的执行策略"""
+        policy = {"mode": settings.tool_default_execution, "timeout": None, "memory_mb": None}
+        policy.update({k: v for k, v in ((tool.metadata or {}).get("execution") or {}).items() if v is not None})
+        policy.update(settings.tool_execution.get(tool.name, {}))
+        if policy["timeout"] is None:
+            policy["timeout"] = settings.tool_timeout
+        return policy
+
+    def wrap(self, tool: BaseTool, source: tuple[str, str] | None = None) -> BaseTool:
+        """
+        按策略包装工具
+        Args:
+            tool: 原工具
+            source: (文件路径, 模块内属性名)，process 模式在子进程中据此重新加载工具
+        """
+        policy = self.policy(tool)
+        mode = policy["mode"]
+        if mode == "inline":
+            return tool
+        if getattr(tool, "coroutine", None) is not None:
+            # 异步工具本身不阻塞事件循环
+            return tool
+        if mode == "process" and source is None:
+            logger.warning(f"工具{tool.name}没有来源文件，改用线程池执行")
+            mode = "thread"
+        if mode == "process":
+            # 加载工具时就启动进程池，首次调用不必等待子进程启动
+            self._get_process_pool()
+
+        async def run(**kwargs):
+            if mode == "process":
+                return await self._submit_process(source, kwargs, policy)
+            return await self._submit_thread(tool, kwargs, policy)
+
+        return StructuredTool.from_function(
+            coroutine=run,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            metadata=tool.metadata,
+            # 超时等执行错误作为工具结果返回给模型
+            handle_tool_error=True,
+        )
+
+    async def _submit_thread(self, tool: BaseTool, args: dict, policy: dict) -> Any:
+        """在线程池执行（超时后线程无法终止，只是不再等待）"""
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(settings.tool_thread_workers, thread_name_prefix="tool")
+            self._stats["thread"] = _PoolStats(settings.tool_thread_workers)
+        future = self._thread_pool.submit(tool.invoke, args)
+        return await self._track("thread", future, policy["timeout"], tool.name)
+
+    async def _submit_process(self, source: tuple[str, str], args: dict, policy: dict) -> Any:
+        """在进程池执行，超时后重建进程池以终止卡住的子进程"""
+        pool = self._get_process_pool()
+        future = pool.submit(_run_in_process, source[0], source[1], args, policy["memory_mb"])
+        try:
+            return await self._track("process", future, policy["timeout"], source[1])
+        except ToolTimeout:
+            # 卡住的子进程只能通过重建进程池终止
+            self._reset_process_pool(pool)
+            raise
+        except BrokenProcessPool as e:
+            # 子进程异常退出
+            self._reset_process_pool(pool)
+            raise ToolException(f"工具进程异常退出: {e}") from e
+
+    async def _track(self, pool_name: str, future: Future, timeout: float, tool_name: str) -> Any:
+        """等待结果；统计在任务实际结束时更新"""
+        stats = self._stats[pool_name]
+        stats.track(future)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError as e:
+            stats.mark_timeout(future)
+            logger.error(f"工具{tool_name}执行超时（{timeout}s）")
+            raise ToolTimeout(f"工具执行超时（{timeout}s）") from e
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """获取（必要时创建并预热）进程池"""
+        if self._process_pool is None:
+            workers = settings.tool_process_workers
+            # spawn 避免在多线程的服务进程中 fork
+            self._process_pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(workers):
+                self._process_pool.submit(_warmup)
+            self._stats.setdefault("process", _PoolStats(workers))
+        return self._process_pool
+
+    def _reset_process_pool(self, pool: ProcessPoolExecutor):
+        """终止进程池中的所有子进程"""
+        if self._process_pool is not pool:
+            return
+        self._process_pool = None
+        # ProcessPoolExecutor 没有公开的终止接口
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def warmup(self):
+        """预先启动进程池（有工具使用 process 模式时）"""
+        self._get_process_pool()
+
+    def shutdown(self):
+        """关闭所有执行池"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    def collect(self) -> dict:
+        """指标采集"""
+        return {name: stats.collect() for name, stats in self._stats.items()}
+
+tool_executor = ToolExecutor()
+metrics.register("tools", tool_executor.collect)
+
+__all__ = [
+    "ExecutionMode",
+    "ToolTimeout",
+    "execution",
+    "ToolExecutor",
+    "tool_executor",
+]